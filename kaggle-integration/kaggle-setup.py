@@ -6,18 +6,101 @@ Automatically downloads and processes satellite imagery datasets for realistic a
 import os
 import sys
 import json
-import zipfile
-import requests
-import pandas as pd
+import datetime
+import types
 from pathlib import Path
 import subprocess
-from typing import Dict, List, Optional, Tuple
+import shutil
+import importlib.util
+import argparse
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+METADATA_FILENAME = "dataset_metadata.json"
+IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.tiff', '.tif'})
+
+
+# Recommended datasets for satellite imagery and change detection
+_RECOMMENDED_DATASETS = types.MappingProxyType({
+    "eurosat": {
+        "name": "eurosat/eurosat",
+        "description": "EuroSAT: Land Use and Land Cover Classification",
+        "size": "~89MB",
+        "images": "27,000",
+        "classes": ("Industrial", "Forest", "Residential", "River", "Highway", "Pasture"),
+        "use_case": "Land cover classification, training data for change detection"
+    },
+    "brazil_amazon": {
+        "name": "nileshely/brazil-amazon-rainforest-degradation",
+        "description": "Brazil Amazon Rainforest Degradation",
+        "size": "~45MB", 
+        "images": "40,000+",
+        "classes": ("Clear", "Cloudy", "Haze", "Partly Cloudy"),
+        "use_case": "Deforestation detection, environmental monitoring"
+    },
+    "sentinel2_cloud": {
+        "name": "sorour/sentinel2-cloud-mask-catalogue",
+        "description": "Sentinel-2 Cloud Mask Catalogue",
+        "size": "~1.2GB",
+        "images": "10,000+", 
+        "classes": ("Clear", "Cloud", "Cloud Shadow", "Snow"),
+        "use_case": "Preprocessing, cloud detection for satellite imagery"
+    },
+    "california_wildfires": {
+        "name": "fantineh/next-day-wildfire-spread",
+        "description": "California Wildfire Spread Prediction",
+        "size": "~500MB",
+        "images": "2,000+",
+        "classes": ("Fire", "No Fire", "Water", "Vegetation"),
+        "use_case": "Disaster monitoring, fire damage assessment"
+    },
+    "urban_growth": {
+        "name": "mahmoudreda55/satellite-image-segmentation",
+        "description": "Satellite Image Segmentation for Urban Growth",
+        "size": "~200MB",
+        "images": "5,000+",
+        "classes": ("Building", "Land", "Road", "Vegetation", "Water"),
+        "use_case": "Urban development monitoring, infrastructure growth"
+    },
+    "spacenet_buildings": {
+        "name": "azavea/spacenet-buildings-dataset-v2",
+        "description": "SpaceNet Buildings Dataset",
+        "size": "~2GB",
+        "images": "15,000+",
+        "classes": ("Building footprints", "Road networks"),
+        "use_case": "Building detection, infrastructure mapping"
+    }
+})
+
+
+class ScanResult(NamedTuple):
+    total_files: int
+    image_files: int
+    sample_images: Tuple[Path, ...]
+
+
+def _scan(root, sample_limit: int = 10) -> ScanResult:
+    """Walk a dataset directory once, counting files and keeping the first few images"""
+    samples = []
+    image_files = 0
+    total_files = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name == METADATA_FILENAME:
+                continue
+            total_files += 1
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTS:
+                image_files += 1
+                if len(samples) < sample_limit:
+                    samples.append(Path(dirpath) / name)
+    return ScanResult(total_files, image_files, tuple(samples))
+
+
 class KaggleDatasetIntegrator:
     def __init__(self, project_root: str = None):
         """Initialize Kaggle dataset integrator"""
@@ -25,57 +108,11 @@ class KaggleDatasetIntegrator:
         self.data_dir = self.project_root / "datasets"
         self.data_dir.mkdir(exist_ok=True)
         
-        # Recommended datasets for satellite imagery and change detection
-        self.recommended_datasets = {
-            "eurosat": {
-                "name": "eurosat/eurosat",
-                "description": "EuroSAT: Land Use and Land Cover Classification",
-                "size": "~89MB",
-                "images": "27,000",
-                "classes": ["Industrial", "Forest", "Residential", "River", "Highway", "Pasture"],
-                "use_case": "Land cover classification, training data for change detection"
-            },
-            "brazil_amazon": {
-                "name": "nileshely/brazil-amazon-rainforest-degradation",
-                "description": "Brazil Amazon Rainforest Degradation",
-                "size": "~45MB", 
-                "images": "40,000+",
-                "classes": ["Clear", "Cloudy", "Haze", "Partly Cloudy"],
-                "use_case": "Deforestation detection, environmental monitoring"
-            },
-            "sentinel2_cloud": {
-                "name": "sorour/sentinel2-cloud-mask-catalogue",
-                "description": "Sentinel-2 Cloud Mask Catalogue",
-                "size": "~1.2GB",
-                "images": "10,000+", 
-                "classes": ["Clear", "Cloud", "Cloud Shadow", "Snow"],
-                "use_case": "Preprocessing, cloud detection for satellite imagery"
-            },
-            "california_wildfires": {
-                "name": "fantineh/next-day-wildfire-spread",
-                "description": "California Wildfire Spread Prediction",
-                "size": "~500MB",
-                "images": "2,000+",
-                "classes": ["Fire", "No Fire", "Water", "Vegetation"],
-                "use_case": "Disaster monitoring, fire damage assessment"
-            },
-            "urban_growth": {
-                "name": "mahmoudreda55/satellite-image-segmentation",
-                "description": "Satellite Image Segmentation for Urban Growth",
-                "size": "~200MB",
-                "images": "5,000+",
-                "classes": ["Building", "Land", "Road", "Vegetation", "Water"],
-                "use_case": "Urban development monitoring, infrastructure growth"
-            },
-            "spacenet_buildings": {
-                "name": "azavea/spacenet-buildings-dataset-v2",
-                "description": "SpaceNet Buildings Dataset",
-                "size": "~2GB",
-                "images": "15,000+",
-                "classes": ["Building footprints", "Road networks"],
-                "use_case": "Building detection, infrastructure mapping"
-            }
-        }
+        # dataset dir -> (directory mtime_ns, scan) for the current session
+        self._scan_cache: Dict[str, Tuple[int, ScanResult]] = {}
+        self._kaggle_api = None
+        
+        self.recommended_datasets = _RECOMMENDED_DATASETS
         
         self.setup_kaggle_api()
     
@@ -129,22 +166,42 @@ class KaggleDatasetIntegrator:
             
             # Test the API
             try:
-                subprocess.run(["kaggle", "datasets", "list", "--max-size", "1"], 
-                             check=True, capture_output=True, text=True)
+                api = self.get_kaggle_api()
+                if api is not None:
+                    api.dataset_list(max_size=1)
+                else:
+                    subprocess.run(["kaggle", "datasets", "list", "--max-size", "1"], 
+                                 check=True, capture_output=True, text=True)
                 print("✅ Kaggle API test successful!")
-            except subprocess.CalledProcessError:
+            except Exception:
                 print("❌ Kaggle API test failed. Please check your credentials.")
                 sys.exit(1)
         else:
             print("❌ Invalid credentials provided")
             sys.exit(1)
     
+    def get_kaggle_api(self):
+        """Return a shared, authenticated in-process Kaggle client (None if not installed)
+        
+        Reusing one client avoids spawning the kaggle CLI per call and keeps its
+        HTTP connections pooled across downloads.
+        """
+        if self._kaggle_api is None:
+            try:
+                from kaggle.api.kaggle_api_extended import KaggleApi
+            except ImportError:
+                return None
+            api = KaggleApi()
+            api.authenticate()
+            self._kaggle_api = api
+        return self._kaggle_api
+    
     def install_kaggle_api(self):
         """Install Kaggle API if not available"""
-        try:
-            subprocess.run(["kaggle", "--version"], check=True, capture_output=True, text=True)
+        # Probe in-process rather than spawning `kaggle --version`
+        if importlib.util.find_spec("kaggle") is not None or shutil.which("kaggle") is not None:
             print("✅ Kaggle API already installed")
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        else:
             print("📦 Installing Kaggle API...")
             subprocess.run([sys.executable, "-m", "pip", "install", "kaggle"], check=True)
             print("✅ Kaggle API installed successfully")
@@ -179,56 +236,67 @@ class KaggleDatasetIntegrator:
             dataset_dir = self.data_dir / dataset_key
             dataset_dir.mkdir(exist_ok=True)
             
-            # Download dataset using Kaggle API
-            cmd = ["kaggle", "datasets", "download", dataset_name, "-p", str(dataset_dir)]
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-            
-            print("✅ Download completed successfully")
+            # Download and extract in one pass so the archive is never re-read
+            # and rewritten from Python; fall back to the CLI without the library
+            api = self.get_kaggle_api()
+            if api is not None:
+                api.dataset_download_files(dataset_name, path=str(dataset_dir), unzip=True, quiet=False)
+            else:
+                cmd = ["kaggle", "datasets", "download", dataset_name, "-p", str(dataset_dir), "--unzip"]
+                subprocess.run(cmd, check=True, capture_output=True, text=True)
             
-            # Extract if it's a zip file
-            zip_files = list(dataset_dir.glob("*.zip"))
-            if zip_files:
-                print("📂 Extracting files...")
-                for zip_file in zip_files:
-                    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                        zip_ref.extractall(dataset_dir)
-                    zip_file.unlink()  # Remove zip file after extraction
-                print("✅ Extraction completed")
+            print("✅ Download and extraction completed successfully")
             
             # Create dataset metadata
             self.create_dataset_metadata(dataset_key, dataset_dir)
             
             return True
             
-        except subprocess.CalledProcessError as e:
+        except Exception as e:
             logger.error(f"Failed to download dataset: {e}")
             return False
     
+    def download_datasets(self, dataset_keys: List[str], workers: int = 4) -> Dict[str, bool]:
+        """Download several datasets concurrently (network-bound, so threads suffice)"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        # Authenticate once up front so the workers share a single client
+        self.get_kaggle_api()
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = executor.map(self.download_dataset, dataset_keys)
+            return dict(zip(dataset_keys, results))
+    
     def create_dataset_metadata(self, dataset_key: str, dataset_dir: Path):
         """Create metadata file for downloaded dataset"""
         dataset_info = self.recommended_datasets[dataset_key]
         
+        # Create the metadata file up front so writing it does not change the
+        # directory mtime recorded alongside the scan
+        metadata_file = dataset_dir / METADATA_FILENAME
+        metadata_file.touch()
+        scan_mtime_ns = dataset_dir.stat().st_mtime_ns
+        
         # Analyze downloaded files
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.tiff', '*.tif']:
-            image_files.extend(list(dataset_dir.rglob(ext)))
+        scan = _scan(dataset_dir)
+        self._scan_cache[str(dataset_dir)] = (scan_mtime_ns, scan)
         
         metadata = {
             "dataset_key": dataset_key,
             "name": dataset_info["name"],
             "description": dataset_info["description"],
-            "download_date": pd.Timestamp.now().isoformat(),
+            "download_date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
             "local_path": str(dataset_dir),
-            "total_files": len(list(dataset_dir.rglob("*.*"))),
-            "image_files": len(image_files),
+            "total_files": scan.total_files,
+            "image_files": scan.image_files,
             "classes": dataset_info["classes"],
             "use_case": dataset_info["use_case"],
-            "sample_images": [str(f.relative_to(dataset_dir)) for f in image_files[:10]]
+            "sample_images": [str(f.relative_to(dataset_dir)) for f in scan.sample_images],
+            "scan_mtime_ns": scan_mtime_ns
         }
         
-        metadata_file = dataset_dir / "dataset_metadata.json"
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        with open(metadata_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, separators=(",", ":"), ensure_ascii=False)
         
         print(f"📋 Dataset metadata saved to: {metadata_file}")
     
@@ -240,11 +308,56 @@ class KaggleDatasetIntegrator:
             return []
         
         # Find image files
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.tiff', '*.tif']:
-            image_files.extend(list(dataset_dir.rglob(ext)))
-        
-        return image_files[:count]
+        return list(self.scan_dataset(dataset_dir, sample_limit=count).sample_images)
+    
+    def scan_dataset(self, dataset_dir: Path, sample_limit: int = 10) -> ScanResult:
+        """Return file/image counts and the first few images of a dataset directory
+        
+        Reuses the in-session cache or the counts persisted in dataset_metadata.json
+        while the directory mtime is unchanged; otherwise walks the directory.
+        """
+        mtime_ns = dataset_dir.stat().st_mtime_ns
+        cached = self._scan_cache.get(str(dataset_dir))
+        scan = cached[1] if cached and cached[0] == mtime_ns else self._load_persisted_scan(dataset_dir, mtime_ns)
+        
+        # A cached scan is only usable if it kept enough sample images
+        if scan is None or len(scan.sample_images) < min(sample_limit, scan.image_files):
+            scan = _scan(dataset_dir, sample_limit)
+        self._scan_cache[str(dataset_dir)] = (mtime_ns, scan)
+        
+        return scan._replace(sample_images=scan.sample_images[:sample_limit])
+    
+    def _load_persisted_scan(self, dataset_dir: Path, mtime_ns: int) -> Optional[ScanResult]:
+        """Load scan counts from dataset_metadata.json if they match the directory mtime"""
+        metadata_file = dataset_dir / METADATA_FILENAME
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if metadata.get("scan_mtime_ns") != mtime_ns:
+            return None
+        
+        return ScanResult(
+            metadata["total_files"],
+            metadata["image_files"],
+            tuple(dataset_dir / p for p in metadata["sample_images"])
+        )
+    
+    def list_downloaded_datasets(self) -> List[str]:
+        """List downloaded dataset directories (scandir reuses d_type, no per-entry stat)"""
+        with os.scandir(self.data_dir) as entries:
+            return [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+    
+    def count_downloaded_images(self, dataset_keys: List[str], workers: int = 4) -> Dict[str, int]:
+        """Count images for several downloaded datasets concurrently"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        dataset_dirs = [self.data_dir / key for key in dataset_keys]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            scans = executor.map(self.scan_dataset, dataset_dirs)
+            return {key: scan.image_files for key, scan in zip(dataset_keys, scans)}
     
     def create_dataset_integration(self, dataset_key: str):
         """Create integration module for specific dataset"""
@@ -275,14 +388,63 @@ Generated automatically for Geo Shift Spy project
 """
 
 import os
-import json
-import numpy as np
-from PIL import Image
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Mapping, Optional, Tuple
 import random
+import functools
+import types
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+IMAGE_EXTS = frozenset({sorted(IMAGE_EXTS)!r})
+
+# Depends only on generation-time constants, so built once per process
+# (read-only; the values are all strings, so no nested copies are needed)
+GEOGRAPHIC_CONTEXT = types.MappingProxyType({{
+    "data_coverage": "{dataset_info.get('coverage', 'Global')}",
+    "spatial_resolution": "10-60 meters per pixel",
+    "temporal_coverage": "Multi-temporal analysis available",
+    "spectral_bands": "Multispectral (RGB + NIR)",
+    "accuracy_level": "Research-grade satellite imagery"
+}})
+
+
+_EMPTY_METADATA = types.MappingProxyType({{}})
+
+
+def _freeze(value):
+    """Read-only view of parsed JSON: objects become mappingproxies, arrays tuples"""
+    if isinstance(value, dict):
+        return types.MappingProxyType({{key: _freeze(item) for key, item in value.items()}})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@functools.lru_cache(maxsize=32)
+def _load_metadata_file(path: str, mtime_ns: int) -> Mapping:
+    """Parse a metadata file once per (path, mtime) and share it, read-only, across instances"""
+    with open(path, 'rb') as f:
+        return _freeze(_json_loads(f.read()))
+
+
+def _reservoir_add(reservoir: List[str], item: str, seen: int, k: int) -> int:
+    """Reservoir-sample item into a list of at most k entries; returns the updated count"""
+    if seen < k:
+        reservoir.append(item)
+    else:
+        j = random.randrange(seen + 1)
+        if j < k:
+            reservoir[j] = item
+    return seen + 1
+
 
 class {dataset_key.title().replace("_", "")}Dataset:
+    __slots__ = ("dataset_key", "data_dir", "metadata", "classes")
+    
     def __init__(self, data_dir: str = None):
         """Initialize {dataset_key} dataset integration"""
         self.dataset_key = "{dataset_key}"
@@ -290,26 +452,33 @@ class {dataset_key.title().replace("_", "")}Dataset:
         self.metadata = self.load_metadata()
         self.classes = {dataset_info["classes"]}
         
-    def load_metadata(self) -> Dict:
-        """Load dataset metadata"""
+    def load_metadata(self) -> Mapping:
+        """Load dataset metadata (read-only)"""
         metadata_file = self.data_dir / "dataset_metadata.json"
         if metadata_file.exists():
-            with open(metadata_file, 'r') as f:
-                return json.load(f)
-        return {{}}
+            return _load_metadata_file(str(metadata_file), metadata_file.stat().st_mtime_ns)
+        return _EMPTY_METADATA
     
     def get_sample_images(self, count: int = 5, category: str = None) -> List[Path]:
-        """Get sample images from the dataset"""
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.tiff', '*.tif']:
-            image_files.extend(list(self.data_dir.rglob(ext)))
-        
-        if category and category in self.classes:
-            # Filter by category if available in folder structure
-            filtered_files = [f for f in image_files if category.lower() in str(f).lower()]
-            image_files = filtered_files if filtered_files else image_files
-        
-        return random.sample(image_files, min(count, len(image_files)))
+        """Get sample images from the dataset (reservoir-sampled during a single walk)"""
+        # Filter by category if available in folder structure
+        needle = category.lower() if category and category in self.classes else None
+        
+        matched, fallback = [], []
+        seen_matched = seen_all = 0
+        for dirpath, _, filenames in os.walk(self.data_dir):
+            for name in filenames:
+                if os.path.splitext(name)[1].lower() not in IMAGE_EXTS:
+                    continue
+                path = os.path.join(dirpath, name)
+                seen_all = _reservoir_add(fallback, path, seen_all, count)
+                if needle and needle in path.lower():
+                    seen_matched = _reservoir_add(matched, path, seen_matched, count)
+        
+        # Fall back to all images when nothing matches the category
+        sample = matched if matched else fallback
+        random.shuffle(sample)
+        return [Path(p) for p in sample]
     
     def get_realistic_change_data(self, change_type: str = None) -> Dict:
         """Generate realistic change detection data based on dataset characteristics"""
@@ -348,34 +517,28 @@ class {dataset_key.title().replace("_", "")}Dataset:
     
     def enhance_analysis_with_dataset(self, analysis_result: Dict) -> Dict:
         """Enhance analysis results with dataset-specific insights"""
-        enhanced = analysis_result.copy()
+        enhanced = {{
+            **analysis_result,
+            # Add dataset-specific metadata
+            "data_source": {{
+                "dataset": "{dataset_info['name']}",
+                "description": "{dataset_info['description']}",
+                "training_images": self.metadata.get("image_files", "Unknown"),
+                "classes_available": len(self.classes)
+            }},
+            # Add realistic geographic context
+            "geographic_context": self.get_geographic_context()
+        }}
         
         # Add dataset-specific confidence boost
         if "confidence_score" in enhanced:
             enhanced["confidence_score"] = min(0.95, enhanced["confidence_score"] * 1.15)
         
-        # Add dataset-specific metadata
-        enhanced["data_source"] = {{
-            "dataset": "{dataset_info['name']}",
-            "description": "{dataset_info['description']}",
-            "training_images": self.metadata.get("image_files", "Unknown"),
-            "classes_available": len(self.classes)
-        }}
-        
-        # Add realistic geographic context
-        enhanced["geographic_context"] = self.get_geographic_context()
-        
         return enhanced
     
-    def get_geographic_context(self) -> Dict:
-        """Provide geographic context based on dataset characteristics"""
-        return {{
-            "data_coverage": "{dataset_info.get('coverage', 'Global')}",
-            "spatial_resolution": "10-60 meters per pixel",
-            "temporal_coverage": "Multi-temporal analysis available",
-            "spectral_bands": "Multispectral (RGB + NIR)",
-            "accuracy_level": "Research-grade satellite imagery"
-        }}
+    def get_geographic_context(self) -> Mapping:
+        """Provide geographic context based on dataset characteristics (shared, read-only)"""
+        return GEOGRAPHIC_CONTEXT
 '''
     
     def create_backend_dataset_config(self, dataset_key: str, dataset_info: Dict):
@@ -395,14 +558,91 @@ class {dataset_key.title().replace("_", "")}Dataset:
         }
         
         config_file = config_dir / f"{dataset_key}.json"
-        with open(config_file, 'w') as f:
-            json.dump(config, f, indent=2)
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump(config, f, separators=(",", ":"), ensure_ascii=False)
         
         print(f"⚙️ Backend configuration created: {config_file}")
 
 
+def _menu_list_recommended(integrator: KaggleDatasetIntegrator, args: argparse.Namespace):
+    integrator.list_recommended_datasets()
+
+
+def _menu_download(integrator: KaggleDatasetIntegrator, args: argparse.Namespace):
+    integrator.list_recommended_datasets()
+    dataset_keys = list(integrator.recommended_datasets.keys())
+    
+    try:
+        selection = input(f"\\nEnter dataset number(s), comma-separated (1-{len(dataset_keys)}): ").strip()
+        dataset_indices = [int(part) - 1 for part in selection.split(",") if part.strip()]
+        
+        if dataset_indices and all(0 <= i < len(dataset_keys) for i in dataset_indices):
+            selected = list(dict.fromkeys(dataset_keys[i] for i in dataset_indices))
+            results = integrator.download_datasets(selected, workers=args.workers)
+            for dataset_key, success in results.items():
+                if success:
+                    print(f"✅ Dataset '{dataset_key}' downloaded successfully!")
+        else:
+            print("❌ Invalid selection")
+    except ValueError:
+        print("❌ Please enter a valid number")
+
+
+def _menu_create_integration(integrator: KaggleDatasetIntegrator, args: argparse.Namespace):
+    # Show downloaded datasets
+    downloaded = integrator.list_downloaded_datasets()
+    if not downloaded:
+        print("❌ No datasets downloaded yet. Please download datasets first.")
+        return
+        
+    print(f"\\n📂 Downloaded datasets: {', '.join(downloaded)}")
+    dataset_key = input("Enter dataset key to create integration: ").strip()
+    
+    if dataset_key in downloaded:
+        integrator.create_dataset_integration(dataset_key)
+        print(f"✅ Integration created for '{dataset_key}'")
+    else:
+        print("❌ Dataset not found locally")
+
+
+def _menu_check_downloaded(integrator: KaggleDatasetIntegrator, args: argparse.Namespace):
+    downloaded = integrator.list_downloaded_datasets()
+    if downloaded:
+        print(f"\\n📂 Downloaded datasets ({len(downloaded)}):")
+        image_counts = integrator.count_downloaded_images(downloaded, workers=args.workers)
+        for dataset, image_count in image_counts.items():
+            print(f"   • {dataset}: {image_count} images")
+    else:
+        print("\\n📂 No datasets downloaded yet")
+
+
+def _menu_exit(integrator: KaggleDatasetIntegrator, args: argparse.Namespace):
+    print("👋 Goodbye!")
+    return False
+
+
+def _menu_invalid(integrator: KaggleDatasetIntegrator, args: argparse.Namespace):
+    print("❌ Invalid choice. Please select 1-5.")
+
+
+MENU_ACTIONS = {
+    "1": _menu_list_recommended,
+    "2": _menu_download,
+    "3": _menu_create_integration,
+    "4": _menu_check_downloaded,
+    "5": _menu_exit,
+}
+
+
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Kaggle dataset integration for Geo Shift Spy")
+    parser.add_argument("choice", nargs="?", choices=sorted(MENU_ACTIONS),
+                        help="Run a single menu option non-interactively and exit")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Number of datasets to download in parallel")
+    args = parser.parse_args()
+    
     print("🛰️ KAGGLE DATASET INTEGRATION FOR GEO SHIFT SPY")
     print("=" * 60)
     
@@ -411,71 +651,23 @@ def main():
     # Install Kaggle API if needed
     integrator.install_kaggle_api()
     
+    if args.choice:
+        MENU_ACTIONS[args.choice](integrator, args)
+        return
+    
     while True:
         print("\\n📋 AVAILABLE OPTIONS:")
         print("1. 📊 List recommended datasets")
-        print("2. 📥 Download a dataset")
+        print("2. 📥 Download datasets")
         print("3. 🔧 Create dataset integration")
         print("4. 📁 Check downloaded datasets")
         print("5. ❌ Exit")
         
         choice = input("\\nSelect an option (1-5): ").strip()
         
-        if choice == "1":
-            integrator.list_recommended_datasets()
-            
-        elif choice == "2":
-            integrator.list_recommended_datasets()
-            dataset_keys = list(integrator.recommended_datasets.keys())
-            
-            try:
-                selection = input(f"\\nEnter dataset number (1-{len(dataset_keys)}): ").strip()
-                dataset_index = int(selection) - 1
-                
-                if 0 <= dataset_index < len(dataset_keys):
-                    dataset_key = dataset_keys[dataset_index]
-                    success = integrator.download_dataset(dataset_key)
-                    if success:
-                        print(f"✅ Dataset '{dataset_key}' downloaded successfully!")
-                else:
-                    print("❌ Invalid selection")
-            except ValueError:
-                print("❌ Please enter a valid number")
-                
-        elif choice == "3":
-            # Show downloaded datasets
-            downloaded = [d.name for d in integrator.data_dir.iterdir() if d.is_dir()]
-            if not downloaded:
-                print("❌ No datasets downloaded yet. Please download datasets first.")
-                continue
-                
-            print(f"\\n📂 Downloaded datasets: {', '.join(downloaded)}")
-            dataset_key = input("Enter dataset key to create integration: ").strip()
-            
-            if dataset_key in downloaded:
-                integrator.create_dataset_integration(dataset_key)
-                print(f"✅ Integration created for '{dataset_key}'")
-            else:
-                print("❌ Dataset not found locally")
-                
-        elif choice == "4":
-            downloaded = [d.name for d in integrator.data_dir.iterdir() if d.is_dir()]
-            if downloaded:
-                print(f"\\n📂 Downloaded datasets ({len(downloaded)}):")
-                for dataset in downloaded:
-                    dataset_dir = integrator.data_dir / dataset
-                    image_count = len([f for f in dataset_dir.rglob("*") if f.suffix.lower() in ['.jpg', '.jpeg', '.png', '.tiff', '.tif']])
-                    print(f"   • {dataset}: {image_count} images")
-            else:
-                print("\\n📂 No datasets downloaded yet")
-                
-        elif choice == "5":
-            print("👋 Goodbye!")
+        if MENU_ACTIONS.get(choice, _menu_invalid)(integrator, args) is False:
             break
-            
-        else:
-            print("❌ Invalid choice. Please select 1-5.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
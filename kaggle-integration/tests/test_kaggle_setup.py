@@ -0,0 +1,82 @@
+"""
+Tests for the Kaggle dataset scanning helpers
+"""
+
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+
+# kaggle-setup.py is a script (hyphenated name), so load it by path
+_spec = importlib.util.spec_from_file_location(
+    "kaggle_setup", Path(__file__).resolve().parents[1] / "kaggle-setup.py")
+kaggle_setup = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(kaggle_setup)
+
+
+@pytest.fixture
+def make_integrator(tmp_path, monkeypatch):
+    """Build integrators rooted at tmp_path, without touching Kaggle credentials"""
+    monkeypatch.setattr(kaggle_setup.KaggleDatasetIntegrator, "setup_kaggle_api", lambda self: None)
+    return lambda: kaggle_setup.KaggleDatasetIntegrator(project_root=str(tmp_path))
+
+
+def _make_dataset(root: Path) -> Path:
+    (root / "train" / "forest").mkdir(parents=True)
+    (root / "train" / "forest" / "a.JPG").write_bytes(b"")
+    (root / "train" / "forest" / "b.tif").write_bytes(b"")
+    (root / "train" / "labels.csv").write_text("id,label\n")
+    (root / "c.png").write_bytes(b"")
+    (root / "README.md").write_text("readme")
+    return root
+
+
+def test_scan_counts_nested_files_and_skips_metadata(tmp_path):
+    root = _make_dataset(tmp_path)
+    (root / kaggle_setup.METADATA_FILENAME).write_text("{}")
+
+    scan = kaggle_setup._scan(root)
+
+    assert scan.total_files == 5
+    assert scan.image_files == 3
+    assert sorted(p.name for p in scan.sample_images) == ["a.JPG", "b.tif", "c.png"]
+
+
+def test_scan_stops_collecting_samples_at_limit(tmp_path):
+    root = _make_dataset(tmp_path)
+
+    scan = kaggle_setup._scan(root, sample_limit=2)
+
+    assert scan.image_files == 3
+    assert len(scan.sample_images) == 2
+
+
+def test_persisted_scan_is_reused_without_walking(make_integrator, monkeypatch):
+    integrator = make_integrator()
+    dataset_dir = _make_dataset(integrator.data_dir / "eurosat")
+    integrator.create_dataset_metadata("eurosat", dataset_dir)
+    expected = kaggle_setup._scan(dataset_dir)
+
+    def fail_scan(*args, **kwargs):
+        raise AssertionError("dataset directory was walked again")
+
+    monkeypatch.setattr(kaggle_setup, "_scan", fail_scan)
+    scan = make_integrator().scan_dataset(dataset_dir)
+
+    assert scan == expected
+
+
+def test_persisted_scan_is_ignored_when_stale_or_corrupt(make_integrator):
+    integrator = make_integrator()
+    dataset_dir = _make_dataset(integrator.data_dir / "eurosat")
+    integrator.create_dataset_metadata("eurosat", dataset_dir)
+    mtime_ns = dataset_dir.stat().st_mtime_ns
+    assert integrator._load_persisted_scan(dataset_dir, mtime_ns) is not None
+
+    os.utime(dataset_dir, ns=(mtime_ns, mtime_ns + 1))
+    assert integrator._load_persisted_scan(dataset_dir, mtime_ns + 1) is None
+
+    (dataset_dir / kaggle_setup.METADATA_FILENAME).write_text("{not json")
+    assert integrator._load_persisted_scan(dataset_dir, mtime_ns) is None
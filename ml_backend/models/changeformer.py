@@ -12,22 +12,29 @@ Features:
 - Binary and multi-class change detection
 """
 
+import os
+import math
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.transforms as transforms
 import numpy as np
 from PIL import Image
 import base64
 import io
 import cv2
-from typing import Dict, Any, Tuple, Optional
+import hashlib
+from typing import Dict, Any, List, Tuple, Optional
 import logging
 import asyncio
+from collections import OrderedDict
 from pathlib import Path
 
 from .base_model import BaseChangeDetectionModel
-from ..utils.model_utils import download_pretrained_weights, encode_image_to_base64
+from ..utils.model_utils import (
+    download_pretrained_weights, encode_array_to_base64, image_to_device_tensor, inference_autocast,
+    compile_for_inference, script_for_inference, capture_cuda_graph, compile_tensorrt, fuse_conv_bn,
+    strip_dropout, optimize_for_cpu, InferenceBatcher
+)
 
 logger = logging.getLogger(__name__)
 
@@ -57,20 +64,27 @@ class MultiHeadSelfAttention(nn.Module):
         self.scale = self.head_dim ** -0.5
         
         self.qkv = nn.Linear(dim, dim * 3, bias=qkv_bias)
-        self.attn_drop = nn.Dropout(attn_drop)
+        self.attn_drop_p = attn_drop
         self.proj = nn.Linear(dim, dim)
         self.proj_drop = nn.Dropout(proj_drop)
     
     def forward(self, x):
         B, N, C = x.shape
-        qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, self.head_dim).permute(2, 0, 3, 1, 4)
-        q, k, v = qkv[0], qkv[1], qkv[2]
-        
-        attn = (q @ k.transpose(-2, -1)) * self.scale
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
+        q, k, v = self.qkv(x).chunk(3, dim=-1)
+        
+        # (B, N, C) -> (B, heads, N, head_dim) with dense strides for the kernel
+        q = q.view(B, N, self.num_heads, self.head_dim).transpose(1, 2).contiguous()
+        k = k.view(B, N, self.num_heads, self.head_dim).transpose(1, 2).contiguous()
+        v = v.view(B, N, self.num_heads, self.head_dim).transpose(1, 2).contiguous()
+        
+        # Fused attention kernel (Flash / memory-efficient on CUDA), never
+        # materializes the full N x N attention matrix
+        x = F.scaled_dot_product_attention(
+            q, k, v,
+            dropout_p=self.attn_drop_p if self.training else 0.0
+        )
         
-        x = (attn @ v).transpose(1, 2).reshape(B, N, C)
+        x = x.transpose(1, 2).reshape(B, N, C)
         x = self.proj(x)
         x = self.proj_drop(x)
         return x
@@ -88,7 +102,7 @@ class TransformerBlock(nn.Module):
         mlp_hidden_dim = int(dim * mlp_ratio)
         self.mlp = nn.Sequential(
             nn.Linear(dim, mlp_hidden_dim),
-            nn.GELU(),
+            nn.GELU(approximate='tanh'),
             nn.Dropout(drop),
             nn.Linear(mlp_hidden_dim, dim),
             nn.Dropout(drop)
@@ -99,6 +113,21 @@ class TransformerBlock(nn.Module):
         x = x + self.mlp(self.norm2(x))
         return x
 
+class StageBlock(nn.Module):
+    """One encoder stage: patch embedding, transformer blocks and norm"""
+    
+    def __init__(self, patch_embed, blocks, norm):
+        super().__init__()
+        self.patch_embed = patch_embed
+        self.blocks = blocks
+        self.norm = norm
+    
+    def forward(self, x):
+        x = self.patch_embed(x)
+        for block in self.blocks:
+            x = block(x)
+        return self.norm(x)
+
 class HierarchicalTransformerEncoder(nn.Module):
     """Hierarchical Transformer Encoder"""
     
@@ -122,29 +151,20 @@ class HierarchicalTransformerEncoder(nn.Module):
                 for _ in range(depths[i])
             ])
             
-            self.stages.append(nn.ModuleDict({
-                'patch_embed': patch_embed,
-                'blocks': blocks,
-                'norm': nn.LayerNorm(embed_dims[i])
-            }))
+            self.stages.append(StageBlock(patch_embed, blocks, nn.LayerNorm(embed_dims[i])))
     
-    def forward(self, x):
-        features = []
+    def forward(self, x) -> List[torch.Tensor]:
+        features: List[torch.Tensor] = []
         
-        for i, stage in enumerate(self.stages):
-            x = stage['patch_embed'](x)
-            for block in stage['blocks']:
-                x = block(x)
-            x = stage['norm'](x)
+        for stage in self.stages:
+            x = stage(x)
             
             # Reshape to spatial format
             B, N, C = x.shape
-            H = W = int(N ** 0.5)
-            x_spatial = x.transpose(1, 2).reshape(B, C, H, W)
-            features.append(x_spatial)
-            
-            if i < len(self.stages) - 1:
-                x = x_spatial
+            H = int(N ** 0.5)
+            # (B, N, C) tokens are already NHWC in memory; keep them channels_last
+            x = x.transpose(1, 2).reshape(B, C, H, H).contiguous(memory_format=torch.channels_last)
+            features.append(x)
         
         return features
 
@@ -192,18 +212,18 @@ class SiameseChangeFormer(nn.Module):
         
         self.num_classes = num_classes
     
-    def forward(self, before, after):
-        # Extract features from both images
-        before_features = self.encoder(before)
-        after_features = self.encoder(after)
-        
+    def encode(self, x):
+        """Extract multi-scale encoder features for a single image batch"""
+        return self.encoder(x)
+    
+    def decode_pair(self, before_features: List[torch.Tensor], after_features: List[torch.Tensor]):
+        """Fuse and decode the encoder features of a before/after pair into change logits"""
         # Fuse features at each scale
-        fused_features = []
-        for i, (bf, af) in enumerate(zip(before_features, after_features)):
+        fused_features: List[torch.Tensor] = []
+        for i, fusion in enumerate(self.fusion_modules):
             # Concatenate and fuse
-            concat_feat = torch.cat([bf, af], dim=1)
-            fused_feat = self.fusion_modules[i](concat_feat)
-            fused_features.append(fused_feat)
+            concat_feat = torch.cat([before_features[i], after_features[i]], dim=1)
+            fused_features.append(fusion(concat_feat))
         
         # Decode fused features
         x = fused_features[-1]  # Start from highest level
@@ -217,29 +237,59 @@ class SiameseChangeFormer(nn.Module):
         change_map = self.head(x)
         
         return change_map
+    
+    def forward(self, before, after):
+        # Extract features from both images in one encoder pass (the encoder
+        # only uses LayerNorm, so samples stay independent within the batch)
+        batch_size = before.shape[0]
+        features = self.encode(torch.cat([before, after], dim=0))
+        before_features = [f[:batch_size] for f in features]
+        after_features = [f[batch_size:] for f in features]
+        
+        return self.decode_pair(before_features, after_features)
 
 class ChangeFormerModel(BaseChangeDetectionModel):
     """ChangeFormer Model Wrapper"""
     
-    def __init__(self, img_size=256, num_classes=2, device=None):
+    def __init__(self, img_size=256, num_classes=2, device=None, max_batch_size=8,
+                 feature_cache_size=0):
         super().__init__()
         
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.img_size = img_size
         self.num_classes = num_classes
+        self.max_batch_size = max_batch_size
         self.version = "1.0"
         
         # Initialize model
         self.model = SiameseChangeFormer(img_size=img_size, num_classes=num_classes)
-        self.model.to(self.device)
+        self.model.to(self.device, memory_format=torch.channels_last)
         self.model.eval()
         
-        # Image preprocessing
-        self.transform = transforms.Compose([
-            transforms.Resize((img_size, img_size)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Modules used for inference; replaced by compiled graphs in load_pretrained
+        self.inference_model = self.model
+        self.inference_encoder = self.model.encoder
+        
+        # Encoder features keyed by image content hash, so an image compared
+        # against several others is only encoded once (LRU, bounded). Off by
+        # default: cached requests encode per image and decode eagerly, so enable
+        # it only for workloads that reuse reference images across many pairs
+        self.feature_cache = OrderedDict()
+        self.feature_cache_size = feature_cache_size
+        self.use_feature_cache = feature_cache_size > 0
+        self._encode_lock = asyncio.Lock()
+        
+        # Concurrent requests are grouped into a single batched forward, padded to
+        # the fixed batch sizes the compiled graph is warmed (or captured) for
+        self.batcher = InferenceBatcher(self._forward_batch, max_batch_size=max_batch_size, pad_batches=True)
+        self.decode_batcher = InferenceBatcher(self._decode_batch, max_batch_size=max_batch_size)
+        
+        # Allow TF32 for the FP32 matmuls that autocast leaves untouched
+        torch.set_float32_matmul_precision('high')
+        
+        # Image preprocessing (normalization constants in 0-255 scale, created once)
+        self.mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1) * 255
         
         logger.info(f"ChangeFormer model initialized on {self.device}")
     
@@ -264,50 +314,168 @@ class ChangeFormerModel(BaseChangeDetectionModel):
         except Exception as e:
             logger.warning(f"Could not load pretrained weights: {str(e)}")
             logger.info("Using randomly initialized weights")
+        
+        # Optimize whichever weights are now in place
+        self._optimize_for_serving()
+    
+    def _optimize_for_serving(self):
+        """Fold BN, strip dropout and compile the serving graph (the eager model serves if this fails)"""
+        try:
+            self._fuse_bn()
+            strip_dropout(self.model)
+            if self.device.type == 'cpu':
+                self.model = optimize_for_cpu(self.model)
+            
+            # Compile after weights are in place; input shape is fixed at img_size
+            if not (os.environ.get("GSS_USE_TRT") == "1" and self.optimize_for_inference()):
+                # Only the graph the serving path uses is compiled: the encoder
+                # (one image at a time) with the feature cache, the full forward
+                # at every batch size the batcher pads to otherwise
+                example = torch.zeros(1, 3, self.img_size, self.img_size, device=self.device)
+                if self.use_feature_cache:
+                    module, examples, batch_sizes = self.model.encoder, (example,), (1,)
+                else:
+                    module, examples, batch_sizes = self.model, (example, example), self.batcher.batch_sizes
+                
+                compiled = compile_for_inference(module, examples, batch_sizes=batch_sizes)
+                if compiled is module:
+                    # torch.compile disabled or unavailable: fall back to TorchScript,
+                    # captured in CUDA graphs on GPU (reduce-overhead mode does this otherwise)
+                    compiled = script_for_inference(module)
+                    if self.device.type == 'cuda':
+                        compiled = capture_cuda_graph(compiled, examples, batch_sizes)
+                
+                if self.use_feature_cache:
+                    self.inference_encoder = compiled
+                else:
+                    self.inference_model = compiled
+            
+        except Exception as e:
+            logger.warning(f"Inference optimization failed, serving the eager model: {str(e)}")
+            self.inference_model = self.model
+            self.inference_encoder = self.model.encoder
+    
+    def _fuse_bn(self):
+        """Fold eval-mode BatchNorm into the preceding convs of the fusion, decoder and head stages"""
+        fused = sum(fuse_conv_bn(m) for m in (self.model.fusion_modules, self.model.decoder, self.model.head))
+        logger.info(f"Folded {fused} BatchNorm layers into ChangeFormer convolutions")
+    
+    def optimize_for_inference(self) -> bool:
+        """Swap in a TensorRT engine for inference (CUDA only); returns True on success"""
+        if self.device.type != 'cuda':
+            logger.info("TensorRT requires CUDA, keeping PyTorch inference")
+            return False
+        
+        input_shape = (1, 3, self.img_size, self.img_size)
+        trt_model = compile_tensorrt(self.model, (input_shape, input_shape),
+                                     f"changeformer_{self.img_size}_trt.ts",
+                                     max_batch_size=self.max_batch_size)
+        if trt_model is None:
+            return False
+        
+        self.inference_model = trt_model
+        # The engine covers the whole forward, so encoder features are not exposed
+        self.use_feature_cache = False
+        logger.info("ChangeFormer running on TensorRT")
+        return True
     
     def preprocess_images(self, before_img: Image.Image, after_img: Image.Image) -> Tuple[torch.Tensor, torch.Tensor]:
         """Preprocess image pair for ChangeFormer"""
-        before_tensor = self.transform(before_img).unsqueeze(0).to(self.device)
-        after_tensor = self.transform(after_img).unsqueeze(0).to(self.device)
+        before_tensor = self._to_tensor(before_img)
+        after_tensor = self._to_tensor(after_img)
         return before_tensor, after_tensor
     
+    def _to_tensor(self, img: Image.Image) -> torch.Tensor:
+        """Upload an image as uint8 and resize/normalize it on the model device"""
+        return image_to_device_tensor(img, (self.img_size, self.img_size), self.device, self.mean, self.std)
+    
+    def _forward_batch(self, before: torch.Tensor, after: torch.Tensor) -> torch.Tensor:
+        """Run one (possibly batched) forward pass, returning float32 logits"""
+        with torch.inference_mode(), inference_autocast(self.device):
+            return self.inference_model(before, after).float()
+    
+    def _decode_batch(self, *features: torch.Tensor) -> torch.Tensor:
+        """Decode a (possibly batched) pair of feature pyramids, returning float32 logits"""
+        num_scales = len(features) // 2
+        with torch.inference_mode(), inference_autocast(self.device):
+            return self.model.decode_pair(features[:num_scales], features[num_scales:]).float()
+    
+    async def get_image_features(self, img: Image.Image) -> List[torch.Tensor]:
+        """Encoder features for an image, served from the content-hash cache when possible"""
+        key = hashlib.sha256(f"{img.mode}:{img.size}".encode() + img.tobytes()).hexdigest()
+        features = self.feature_cache.get(key)
+        if features is not None:
+            self.feature_cache.move_to_end(key)
+            return features
+        
+        # Encode off the event loop; one at a time, since a compiled or
+        # graph-captured encoder reuses its buffers
+        async with self._encode_lock:
+            features = await asyncio.to_thread(self._encode_image, img)
+        
+        self.feature_cache[key] = features
+        if len(self.feature_cache) > self.feature_cache_size:
+            self.feature_cache.popitem(last=False)
+        return features
+    
+    def _encode_image(self, img: Image.Image) -> List[torch.Tensor]:
+        """Run the inference encoder on a single image"""
+        tensor = self._to_tensor(img)
+        with torch.inference_mode(), inference_autocast(self.device):
+            # Clone: compiled graphs may reuse their output buffers on the next call
+            return [f.clone() for f in self.inference_encoder(tensor)]
+    
+    @staticmethod
+    def _logit(p: float) -> float:
+        """Inverse sigmoid, saturating to +/-inf at the ends of [0, 1]"""
+        if p <= 0.0:
+            return -math.inf
+        if p >= 1.0:
+            return math.inf
+        return math.log(p / (1.0 - p))
+    
+    def _build_binary_result(self, change_logits: torch.Tensor, threshold: float) -> Dict[str, Any]:
+        """Turn batch-1 change logits into the binary detection result"""
+        with torch.inference_mode():
+            # For two classes softmax(x)[1] == sigmoid(x1 - x0), so threshold
+            # the logit margin instead of normalizing
+            margin = change_logits[:, 1] - change_logits[:, 0]
+            change_map = margin > self._logit(threshold)
+            
+            # Reduce on device; only the uint8 change map is copied to host
+            change_percentage = float(change_map.float().mean() * 100)
+            confidence_score = float(torch.sigmoid(margin.abs()).mean())  # max class probability
+            change_map_np = change_map.squeeze(0).to(torch.uint8).cpu().numpy()
+        
+        # Generate visualization
+        change_map_base64 = encode_array_to_base64(self._change_visualization_array(change_map_np))
+        
+        return {
+            "change_percentage": change_percentage,
+            "change_map_base64": change_map_base64,
+            "change_map": change_map_np,
+            "confidence_score": confidence_score,
+            "model_type": "changeformer",
+            "analysis_type": "binary"
+        }
+    
     async def detect_binary_changes(self, before_img: Image.Image, after_img: Image.Image, 
                                   threshold: float = 0.5) -> Dict[str, Any]:
         """Detect binary changes using ChangeFormer"""
         try:
-            # Preprocess images
-            before_tensor, after_tensor = self.preprocess_images(before_img, after_img)
-            
-            # Run inference
-            with torch.no_grad():
-                change_logits = self.model(before_tensor, after_tensor)
-                change_probs = F.softmax(change_logits, dim=1)
-                change_map = (change_probs[:, 1] > threshold).float()
-            
-            # Convert to numpy
-            change_map_np = change_map.squeeze().cpu().numpy()
-            change_probs_np = change_probs.squeeze().cpu().numpy()
-            
-            # Calculate change percentage
-            total_pixels = change_map_np.shape[0] * change_map_np.shape[1]
-            changed_pixels = np.sum(change_map_np > 0)
-            change_percentage = (changed_pixels / total_pixels) * 100
-            
-            # Calculate confidence score
-            confidence_score = float(np.mean(np.max(change_probs_np, axis=0)))
-            
-            # Generate visualization
-            change_map_viz = self.generate_change_visualization(change_map_np)
-            change_map_base64 = encode_image_to_base64(change_map_viz)
+            if self.use_feature_cache:
+                # Encode each image once (cached), then decode the pair
+                before_features = await self.get_image_features(before_img)
+                after_features = await self.get_image_features(after_img)
+                change_logits = await self.decode_batcher.submit(*before_features, *after_features)
+            else:
+                # Preprocess images
+                before_tensor, after_tensor = self.preprocess_images(before_img, after_img)
+                
+                # Run inference (batched with any concurrent requests)
+                change_logits = await self.batcher.submit(before_tensor, after_tensor)
             
-            return {
-                "change_percentage": float(change_percentage),
-                "change_map_base64": change_map_base64,
-                "change_map": change_map_np,
-                "confidence_score": confidence_score,
-                "model_type": "changeformer",
-                "analysis_type": "binary"
-            }
+            return self._build_binary_result(change_logits, threshold)
             
         except Exception as e:
             logger.error(f"Error in binary change detection: {str(e)}")
@@ -337,18 +505,16 @@ class ChangeFormerModel(BaseChangeDetectionModel):
         
         return binary_result
     
+    def _change_visualization_array(self, change_map: np.ndarray) -> np.ndarray:
+        """RGB uint8 visualization of a change map"""
+        # Red for changes, transparent for no change (green and blue are identical)
+        changed = (change_map * 255).astype(np.uint8)
+        unchanged = 255 - changed
+        return np.stack([changed, unchanged, unchanged], axis=-1)
+    
     def generate_change_visualization(self, change_map: np.ndarray) -> Image.Image:
         """Generate colored visualization of change map"""
-        # Create RGB visualization
-        h, w = change_map.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        # Red for changes, transparent for no change
-        viz[:, :, 0] = (change_map * 255).astype(np.uint8)  # Red channel
-        viz[:, :, 1] = ((1 - change_map) * 255).astype(np.uint8)  # Green channel
-        viz[:, :, 2] = ((1 - change_map) * 255).astype(np.uint8)  # Blue channel
-        
-        return Image.fromarray(viz)
+        return Image.fromarray(self._change_visualization_array(change_map))
     
     async def perform_segmentation(self, before_img: Image.Image, after_img: Image.Image) -> Dict[str, Any]:
         """Perform segmentation (placeholder - would need segmentation-specific model)"""
@@ -12,11 +12,15 @@ Features:
 - Land cover classification for satellite imagery
 """
 
+import os
+import copy
+import hashlib
+from collections import OrderedDict
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.transforms as transforms
 import torchvision.models as models
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 import numpy as np
 from PIL import Image
 import base64
@@ -27,7 +31,10 @@ import logging
 import asyncio
 
 from .base_model import BaseChangeDetectionModel
-from ..utils.model_utils import download_pretrained_weights, encode_image_to_base64
+from ..utils.model_utils import (
+    download_pretrained_weights, encode_image_to_base64, image_to_device_tensor, inference_autocast,
+    script_for_inference, capture_cuda_graph, fuse_conv_bn, compile_tensorrt, load_calibration_images
+)
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +48,11 @@ class AtrousConv(nn.Module):
         self.bn = nn.BatchNorm2d(out_channels)
         self.relu = nn.ReLU(inplace=True)
     
+    def fuse_bn(self):
+        """Fold the eval-mode BatchNorm into the convolution"""
+        self.conv = fuse_conv_bn_eval(self.conv, self.bn)
+        self.bn = nn.Identity()
+    
     def forward(self, x):
         x = self.conv(x)
         x = self.bn(x)
@@ -112,8 +124,12 @@ class DeepLabV3Plus(nn.Module):
         else:
             raise ValueError("Backbone must be resnet50 or resnet101")
         
-        # Remove fully connected layers
-        self.backbone = nn.Sequential(*list(self.backbone.children())[:-2])
+        # Remove fully connected layers and split after conv2_x, whose output
+        # doubles as the decoder's low-level features
+        children = list(self.backbone.children())[:-2]
+        self.backbone_low = nn.Sequential(*children[:5])
+        self.backbone_high = nn.Sequential(*children[5:])
+        del self.backbone
         
         # Modify backbone for atrous convolution
         # Make conv4_x and conv5_x use dilated convolutions
@@ -146,24 +162,26 @@ class DeepLabV3Plus(nn.Module):
         
     def _modify_backbone(self):
         """Modify backbone to use dilated convolutions"""
-        # This is a simplified version - in practice you'd modify specific layers
-        # to use dilated convolutions in conv4_x and conv5_x
-        pass
+        # Trade the stride-2 downsamples of conv4_x (layer3) and conv5_x (layer4)
+        # for dilation, so ASPP sees stride-8 features with the same receptive field
+        for layer, dilation in ((self.backbone_high[1], 2), (self.backbone_high[2], 4)):
+            for block in layer:
+                block.conv2.stride = (1, 1)
+                block.conv2.dilation = (dilation, dilation)
+                block.conv2.padding = (dilation, dilation)
+                if block.downsample is not None:
+                    block.downsample[0].stride = (1, 1)
     
     def forward(self, x):
         input_size = x.shape[-2:]
         
         # Extract features
-        features = []
-        for i, layer in enumerate(self.backbone):
-            x = layer(x)
-            if i == 4:  # After conv2_x (low-level features)
-                low_level_features = x
-            features.append(x)
+        low_level_features = self.backbone_low(x)  # After conv2_x
+        x = self.backbone_high(low_level_features)
         
         # ASPP
         x = self.aspp(x)  # High-level features
-        x = F.interpolate(x, scale_factor=4, mode='bilinear', align_corners=True)
+        x = F.interpolate(x, size=low_level_features.shape[-2:], mode='bilinear', align_corners=True)
         
         # Process low-level features
         low_level_features = self.low_level_conv(low_level_features)
@@ -211,7 +229,11 @@ class DeepLabV3PlusModel(BaseChangeDetectionModel):
         9: [255, 255, 255]   # ice_snow - white
     }
     
-    def __init__(self, img_size=512, num_classes=10, backbone='resnet101', device=None):
+    # Images above this many pixels are not cached; hashing them costs more than it saves
+    SEGMENTATION_CACHE_MAX_PIXELS = 4096 * 4096
+    
+    def __init__(self, img_size=512, num_classes=10, backbone='resnet101', device=None,
+                 segmentation_cache_size=8):
         super().__init__()
         
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -222,15 +244,38 @@ class DeepLabV3PlusModel(BaseChangeDetectionModel):
         
         # Initialize model
         self.model = DeepLabV3Plus(num_classes=num_classes, backbone=backbone, pretrained=True)
-        self.model.to(self.device)
+        self.model.to(self.device, memory_format=torch.channels_last)
         self.model.eval()
         
-        # Image preprocessing
-        self.transform = transforms.Compose([
-            transforms.Resize((img_size, img_size)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Input size is fixed, so let cuDNN pick the fastest conv kernels once
+        torch.backends.cudnn.benchmark = True
+        
+        # Class id -> RGB lookup table for visualization (unknown classes stay black)
+        self._palette = np.zeros((max(num_classes, max(self.CLASS_COLORS) + 1), 3), dtype=np.uint8)
+        for class_id, color in self.CLASS_COLORS.items():
+            self._palette[class_id] = color
+        
+        # (before, after) class pair -> RGB lookup table for change visualization
+        self._change_lut = self._build_change_lut(num_classes)
+        
+        # Scratch buffer reused by the visualization methods; Image.fromarray
+        # copies RGB data, so returned images never alias it
+        self._viz_buf = np.empty((img_size, img_size, 3), dtype=np.uint8)
+        
+        # Segmentation results keyed by image content hash, so an image reused
+        # across analyses (e.g. a shared "before" tile) is segmented once (LRU, bounded)
+        self.segmentation_cache = OrderedDict()
+        self.segmentation_cache_size = segmentation_cache_size
+        
+        # Module used for inference; replaced by a TorchScript graph in load_pretrained
+        self.inference_model = self.model
+        self.model_int8 = None
+        
+        # Image preprocessing (resize/normalize run on device, 0-255 scale)
+        self._mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1) * 255
+        self._std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1) * 255
+        # Uploads go on their own stream so they overlap the previous inference
+        self._upload_stream = torch.cuda.Stream(device=self.device) if self.device.type == 'cuda' else None
         
         logger.info(f"DeepLabV3+ ({backbone}) model initialized on {self.device}")
     
@@ -254,51 +299,192 @@ class DeepLabV3PlusModel(BaseChangeDetectionModel):
         except Exception as e:
             logger.warning(f"Could not load pretrained weights: {str(e)}")
             logger.info("Using backbone pretrained weights only")
+        
+        # Optimize whichever weights are now in place
+        self._optimize_for_serving()
     
-    def preprocess_image(self, img: Image.Image) -> torch.Tensor:
-        """Preprocess single image for DeepLabV3+"""
-        return self.transform(img).unsqueeze(0).to(self.device)
-    
-    async def segment_land_cover(self, img: Image.Image) -> Dict[str, Any]:
-        """Perform land cover segmentation"""
+    def _optimize_for_serving(self):
+        """Fold BN and trace the fixed-size forward, or lower it to TensorRT/INT8 when enabled (eager on failure)"""
         try:
-            # Preprocess image
-            img_tensor = self.preprocess_image(img)
+            self._fuse_bn()
             
-            # Run inference
-            with torch.no_grad():
-                logits = self.model(img_tensor)
-                probs = F.softmax(logits, dim=1)
-                predictions = torch.argmax(probs, dim=1)
+            if not (os.environ.get("GSS_USE_TRT") == "1" and self.optimize_for_inference()):
+                # Freeze the weights into an optimized graph for the fixed input size
+                example = torch.zeros(1, 3, self.img_size, self.img_size, device=self.device)
+                example = example.contiguous(memory_format=torch.channels_last)
+                self.inference_model = script_for_inference(self.model, (example,))
+                
+                if self.device.type == 'cuda':
+                    # Replay the fixed-shape forwards as single graph launches: batch 1
+                    # for segmentation, batch 2 for before/after change detection
+                    # (the outer graph falls through to the inner one for other shapes)
+                    self.inference_model = capture_cuda_graph(self.inference_model, (example,))
+                    pair = torch.cat([example, example], dim=0)
+                    self.inference_model = capture_cuda_graph(self.inference_model, (pair,))
             
-            # Convert to numpy
-            predictions_np = predictions.squeeze().cpu().numpy()
-            probs_np = probs.squeeze().cpu().numpy()
+            # INT8 on CPU when calibration tiles are provided
+            calibration_dir = os.environ.get("GSS_INT8_CALIBRATION_DIR")
+            if self.device.type == 'cpu' and calibration_dir:
+                self.quantize_for_cpu(load_calibration_images(calibration_dir))
             
-            # Calculate class percentages
-            class_percentages = {}
-            total_pixels = predictions_np.size
-            for class_id, class_name in self.LAND_COVER_CLASSES.items():
-                class_pixels = np.sum(predictions_np == class_id)
-                class_percentages[class_name] = float(class_pixels / total_pixels * 100)
+        except Exception as e:
+            logger.warning(f"Inference optimization failed, serving the eager model: {str(e)}")
+            self.inference_model = self.model
+    
+    def _fuse_bn(self):
+        """Fold eval-mode BatchNorm into the preceding convs (ASPP branches, decoder and backbone Sequentials)"""
+        fused = fuse_conv_bn(self.model)
+        for module in self.model.modules():
+            if isinstance(module, AtrousConv):
+                module.fuse_bn()
+                fused += 1
+        logger.info(f"Folded {fused} BatchNorm layers into DeepLabV3+ convolutions")
+    
+    def optimize_for_inference(self) -> bool:
+        """Swap in a TensorRT engine for inference (CUDA only); returns True on success"""
+        if self.device.type != 'cuda':
+            logger.info("TensorRT requires CUDA, keeping PyTorch inference")
+            return False
+        
+        # Batch 1 for segmentation, batch 2 for before/after change detection
+        trt_model = compile_tensorrt(self.model, ((1, 3, self.img_size, self.img_size),),
+                                     f"deeplabv3plus_{self.backbone}_{self.img_size}_trt.ts",
+                                     max_batch_size=2)
+        if trt_model is None:
+            return False
+        
+        self.inference_model = trt_model
+        logger.info("DeepLabV3+ running on TensorRT")
+        return True
+    
+    def quantize_for_cpu(self, calibration_images: List[Image.Image]) -> bool:
+        """
+        Post-training static INT8 quantization (FX graph mode) for CPU inference
+        
+        Conv-BN-ReLU blocks are fused during prepare; observers are calibrated
+        on the given images. On success the INT8 model serves all requests.
+        
+        Args:
+            calibration_images: Representative satellite tiles (~50)
             
-            # Generate visualization
-            segmentation_viz = self.generate_segmentation_visualization(predictions_np)
-            segmentation_base64 = encode_image_to_base64(segmentation_viz)
+        Returns:
+            True if the INT8 model is in use
+        """
+        if self.device.type != 'cpu' or not calibration_images:
+            return False
+        
+        try:
+            from torch.ao.quantization import get_default_qconfig_mapping
+            from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
             
-            # Calculate confidence
-            max_probs = np.max(probs_np, axis=0)
-            avg_confidence = float(np.mean(max_probs))
+            example = self.preprocess_image(calibration_images[0])
+            prepared = prepare_fx(copy.deepcopy(self.model).eval(), get_default_qconfig_mapping('x86'), (example,))
+            with torch.inference_mode():
+                for img in calibration_images:
+                    prepared(self.preprocess_image(img))
             
-            return {
-                "segmentation_map_base64": segmentation_base64,
-                "segmentation_map": predictions_np,
-                "land_cover_classes": list(self.LAND_COVER_CLASSES.values()),
-                "class_percentages": class_percentages,
-                "confidence_score": avg_confidence,
-                "model_type": "deeplabv3plus",
-                "analysis_type": "segmentation"
-            }
+            self.model_int8 = convert_fx(prepared)
+            self.inference_model = self.model_int8
+            logger.info(f"DeepLabV3+ quantized to INT8 ({len(calibration_images)} calibration images)")
+            return True
+            
+        except Exception as e:
+            logger.warning(f"INT8 quantization failed, keeping FP32 model: {str(e)}")
+            return False
+    
+    def preprocess_image(self, img: Image.Image) -> torch.Tensor:
+        """Preprocess single image for DeepLabV3+"""
+        return image_to_device_tensor(img, (self.img_size, self.img_size), self.device, self._mean, self._std,
+                                      stream=self._upload_stream)
+    
+    def _segment_batch(self, imgs: List[Image.Image]) -> List[Dict[str, Any]]:
+        """Segment several images with one batched forward pass"""
+        # Preprocess images
+        img_tensor = torch.cat([self.preprocess_image(img) for img in imgs], dim=0)
+        
+        # Run inference (the bilinear upsample to input size is part of the graph)
+        with torch.inference_mode():
+            with inference_autocast(self.device):
+                logits = self.inference_model(img_tensor)
+                # Softmax is monotonic, so the argmax comes straight from the logits
+                # and only the winning class probability is formed:
+                # exp(max - logsumexp), with autocast running logsumexp in FP32
+                max_logits, predictions = logits.max(dim=1)
+                max_probs = torch.exp(max_logits.float() - torch.logsumexp(logits, dim=1))
+            
+            # Per-image class counts (one bincount over offset labels) and
+            # confidence, reduced on device
+            num_bins = max(self.num_classes, len(self.LAND_COVER_CLASSES))
+            offsets = torch.arange(len(imgs), device=predictions.device).view(-1, 1, 1) * num_bins
+            class_counts = torch.bincount((predictions + offsets).flatten(), minlength=len(imgs) * num_bins)
+            class_counts = class_counts.view(len(imgs), num_bins)
+            confidences = max_probs.mean(dim=(1, 2))
+        
+        # Only the label maps (compact dtype) and the reductions go to host
+        label_dtype = torch.uint8 if self.num_classes <= 256 else torch.int64
+        predictions_np = predictions.to(label_dtype).cpu().numpy()
+        class_counts_np = class_counts.cpu().numpy()
+        confidences = confidences.tolist()
+        
+        return [self._segmentation_result(predictions_np[i], class_counts_np[i], confidences[i])
+                for i in range(len(imgs))]
+    
+    def _segment_cached(self, imgs: List[Image.Image]) -> List[Dict[str, Any]]:
+        """Segment images, serving repeated images from the content-hash cache"""
+        keys = [self._image_fingerprint(img) for img in imgs]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(imgs)
+        misses = []
+        for i, key in enumerate(keys):
+            if key is not None and key in self.segmentation_cache:
+                self.segmentation_cache.move_to_end(key)
+                results[i] = self.segmentation_cache[key]
+            else:
+                misses.append(i)
+        
+        if misses:
+            for i, result in zip(misses, self._segment_batch([imgs[i] for i in misses])):
+                results[i] = result
+                if keys[i] is not None:
+                    self.segmentation_cache[keys[i]] = result
+                    if len(self.segmentation_cache) > self.segmentation_cache_size:
+                        self.segmentation_cache.popitem(last=False)
+        
+        # Shallow copies so callers can annotate results without touching the cache
+        return [dict(result) for result in results]
+    
+    def _image_fingerprint(self, img: Image.Image) -> Optional[bytes]:
+        """Content hash of an image, or None when it should not be cached"""
+        if self.segmentation_cache_size <= 0 or img.width * img.height > self.SEGMENTATION_CACHE_MAX_PIXELS:
+            return None
+        return hashlib.blake2b(f"{img.mode}:{img.size}".encode() + img.tobytes(), digest_size=16).digest()
+    
+    def _segmentation_result(self, predictions_np: np.ndarray, class_counts: np.ndarray,
+                             avg_confidence: float) -> Dict[str, Any]:
+        """Build the segmentation result for one image"""
+        # Calculate class percentages
+        class_percentages = {}
+        total_pixels = predictions_np.size
+        for class_id, class_name in self.LAND_COVER_CLASSES.items():
+            class_percentages[class_name] = float(class_counts[class_id] / total_pixels * 100)
+        
+        # Generate visualization
+        segmentation_viz = self.generate_segmentation_visualization(predictions_np)
+        segmentation_base64 = encode_image_to_base64(segmentation_viz)
+        
+        return {
+            "segmentation_map_base64": segmentation_base64,
+            "segmentation_map": predictions_np,
+            "land_cover_classes": list(self.LAND_COVER_CLASSES.values()),
+            "class_percentages": class_percentages,
+            "confidence_score": avg_confidence,
+            "model_type": "deeplabv3plus",
+            "analysis_type": "segmentation"
+        }
+    
+    async def segment_land_cover(self, img: Image.Image) -> Dict[str, Any]:
+        """Perform land cover segmentation"""
+        try:
+            return self._segment_cached([img])[0]
             
         except Exception as e:
             logger.error(f"Error in land cover segmentation: {str(e)}")
@@ -308,9 +494,8 @@ class DeepLabV3PlusModel(BaseChangeDetectionModel):
                                   threshold: float = 0.5) -> Dict[str, Any]:
         """Detect changes using segmentation difference"""
         try:
-            # Segment both images
-            before_result = await self.segment_land_cover(before_img)
-            after_result = await self.segment_land_cover(after_img)
+            # Segment both images in one batch (cached images are skipped)
+            before_result, after_result = self._segment_cached([before_img, after_img])
             
             before_seg = before_result["segmentation_map"]
             after_seg = after_result["segmentation_map"]
@@ -349,20 +534,22 @@ class DeepLabV3PlusModel(BaseChangeDetectionModel):
                                       threshold: float = 0.5) -> Dict[str, Any]:
         """Detect multi-class land cover changes"""
         try:
-            # Get segmentation results for both images
-            before_result = await self.segment_land_cover(before_img)
-            after_result = await self.segment_land_cover(after_img)
+            # Get segmentation results for both images (one batch)
+            before_result, after_result = self._segment_cached([before_img, after_img])
             
             before_seg = before_result["segmentation_map"]
             after_seg = after_result["segmentation_map"]
             
-            # Analyze class transitions
+            # Analyze class transitions (C x C transition matrix in one pass)
             class_transitions = {}
+            transition_matrix = np.bincount(
+                before_seg.ravel().astype(np.int64) * self.num_classes + after_seg.ravel(),
+                minlength=self.num_classes ** 2
+            ).reshape(self.num_classes, self.num_classes)
             for from_class in range(self.num_classes):
                 for to_class in range(self.num_classes):
                     if from_class != to_class:
-                        transition_mask = (before_seg == from_class) & (after_seg == to_class)
-                        transition_count = np.sum(transition_mask)
+                        transition_count = transition_matrix[from_class, to_class]
                         
                         if transition_count > 0:
                             from_name = self.LAND_COVER_CLASSES[from_class]
@@ -396,59 +583,67 @@ class DeepLabV3PlusModel(BaseChangeDetectionModel):
             logger.error(f"Error in multi-class change detection: {str(e)}")
             raise
     
+    def _viz_buffer(self, h: int, w: int) -> np.ndarray:
+        """Reusable (h, w, 3) uint8 buffer; allocates only for non-default sizes"""
+        if self._viz_buf.shape[:2] == (h, w):
+            return self._viz_buf
+        return np.empty((h, w, 3), dtype=np.uint8)
+    
     def generate_segmentation_visualization(self, segmentation_map: np.ndarray) -> Image.Image:
         """Generate colored visualization of segmentation map"""
-        h, w = segmentation_map.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        for class_id, color in self.CLASS_COLORS.items():
-            mask = segmentation_map == class_id
-            viz[mask] = color
-        
+        viz = self._viz_buffer(*segmentation_map.shape)
+        np.take(self._palette, segmentation_map, axis=0, out=viz, mode='clip')
         return Image.fromarray(viz)
     
     def generate_change_visualization(self, change_map: np.ndarray) -> Image.Image:
         """Generate visualization for binary change map"""
-        h, w = change_map.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
+        viz = self._viz_buffer(*change_map.shape)
         
         # Red for changes, white for no change
-        viz[:, :, 0] = (change_map * 255).astype(np.uint8)  # Red channel
-        viz[:, :, 1] = ((1 - change_map) * 255).astype(np.uint8)  # Green channel
-        viz[:, :, 2] = ((1 - change_map) * 255).astype(np.uint8)  # Blue channel
+        np.multiply(change_map, 255, out=viz[:, :, 0], casting='unsafe')  # Red channel
+        np.subtract(255, viz[:, :, 0], out=viz[:, :, 1])  # Green channel
+        viz[:, :, 2] = viz[:, :, 1]  # Blue channel
         
         return Image.fromarray(viz)
     
     def generate_multiclass_change_visualization(self, before_seg: np.ndarray, 
                                                after_seg: np.ndarray) -> Image.Image:
         """Generate visualization showing different types of changes"""
-        h, w = before_seg.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
+        key = before_seg.astype(np.intp) * self.num_classes + after_seg
+        viz = self._viz_buffer(*before_seg.shape)
+        np.take(self._change_lut, key, axis=0, out=viz, mode='clip')
+        return Image.fromarray(viz)
+    
+    @staticmethod
+    def _build_change_lut(num_classes: int) -> np.ndarray:
+        """Colors for every (before, after) class pair, indexed by before * num_classes + after"""
+        before = np.repeat(np.arange(num_classes), num_classes)
+        after = np.tile(np.arange(num_classes), num_classes)
+        lut = np.zeros((num_classes * num_classes, 3), dtype=np.uint8)
         
-        # Different colors for different change types
-        change_mask = before_seg != after_seg
+        # Different colors for different change types (later rules take precedence)
+        change_mask = before != after
         
         # Forest loss (forest to other) - red
-        forest_loss = (before_seg == 3) & change_mask
-        viz[forest_loss] = [255, 0, 0]
+        forest_loss = (before == 3) & change_mask
+        lut[forest_loss] = [255, 0, 0]
         
         # Urban expansion (other to urban) - purple
-        urban_expansion = (after_seg == 1) & change_mask
-        viz[urban_expansion] = [128, 0, 128]
+        urban_expansion = (after == 1) & change_mask
+        lut[urban_expansion] = [128, 0, 128]
         
         # Water changes - blue
-        water_changes = ((before_seg == 4) | (after_seg == 4)) & change_mask
-        viz[water_changes] = [0, 0, 255]
+        water_changes = ((before == 4) | (after == 4)) & change_mask
+        lut[water_changes] = [0, 0, 255]
         
         # Other changes - orange
         other_changes = change_mask & ~forest_loss & ~urban_expansion & ~water_changes
-        viz[other_changes] = [255, 165, 0]
+        lut[other_changes] = [255, 165, 0]
         
         # No change - light gray
-        no_change = ~change_mask
-        viz[no_change] = [211, 211, 211]
+        lut[~change_mask] = [211, 211, 211]
         
-        return Image.fromarray(viz)
+        return lut
     
     async def perform_segmentation(self, before_img: Image.Image, after_img: Image.Image) -> Dict[str, Any]:
         """Perform comprehensive segmentation analysis"""
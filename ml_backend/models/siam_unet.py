@@ -10,24 +10,63 @@ Features:
 - Binary and multi-class change detection
 """
 
+import os
+import copy
+import hashlib
+from collections import OrderedDict
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.transforms as transforms
 import numpy as np
 from PIL import Image
 import base64
 import io
 import cv2
-from typing import Dict, Any, Tuple, Optional
+try:
+    import numba
+except ImportError:
+    numba = None
+from typing import Dict, Any, Tuple, Optional, List
 import logging
 import asyncio
 
 from .base_model import BaseChangeDetectionModel
-from ..utils.model_utils import download_pretrained_weights, encode_image_to_base64
+from ..utils.model_utils import (
+    download_pretrained_weights, encode_array_to_base64, image_to_device_tensor, inference_autocast,
+    compile_for_inference, script_for_inference, fuse_conv_bn, compile_tensorrt, load_calibration_images
+)
 
 logger = logging.getLogger(__name__)
 
+def abs_diff(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    """|a - b| with the abs applied in place, so the pair fuses into one elementwise kernel"""
+    # Plain function rather than @torch.jit.script: it inlines into the
+    # scripted/compiled graphs either way and stays traceable by FX
+    return (a - b).abs_()
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _binary_change_stats(logits, threshold, change_map):
+        """
+        Single pass over 2-class logits (2, H, W): writes the thresholded
+        change map and returns (changed pixels, summed max-class probability)
+        """
+        changed = 0
+        confidence = 0.0
+        for i in numba.prange(change_map.shape[0]):
+            for j in range(change_map.shape[1]):
+                # softmax(x)[1] == sigmoid(x1 - x0)
+                p = 1.0 / (1.0 + np.exp(logits[0, i, j] - logits[1, i, j]))
+                if p > threshold:
+                    change_map[i, j] = 1
+                    changed += 1
+                else:
+                    change_map[i, j] = 0
+                confidence += max(p, 1.0 - p)
+        return changed, confidence
+else:
+    _binary_change_stats = None
+
 class DoubleConv(nn.Module):
     """Double Convolution Block for U-Net"""
     
@@ -64,25 +103,31 @@ class Down(nn.Module):
 class Up(nn.Module):
     """Upscaling then double conv"""
     
+    __constants__ = ['bilinear']
+    
     def __init__(self, in_channels, out_channels, bilinear=True):
         super().__init__()
         
+        # Bilinear upsampling is done functionally in forward, straight to the skip size
+        self.bilinear = bilinear
         if bilinear:
-            self.up = nn.Upsample(scale_factor=2, mode='bilinear', align_corners=True)
             self.conv = DoubleConv(in_channels, out_channels, in_channels // 2)
         else:
             self.up = nn.ConvTranspose2d(in_channels, in_channels // 2, kernel_size=2, stride=2)
             self.conv = DoubleConv(in_channels, out_channels)
     
     def forward(self, x1, x2):
-        x1 = self.up(x1)
-        
-        # Input is CHW
-        diffY = x2.size()[2] - x1.size()[2]
-        diffX = x2.size()[3] - x1.size()[3]
-        
-        x1 = F.pad(x1, [diffX // 2, diffX - diffX // 2,
-                        diffY // 2, diffY - diffY // 2])
+        if self.bilinear:
+            x1 = F.interpolate(x1, size=x2.shape[-2:], mode='bilinear', align_corners=True)
+        else:
+            x1 = self.up(x1)
+            
+            # Input is CHW; odd skip sizes leave the transposed conv one pixel short
+            if x1.shape[-2:] != x2.shape[-2:]:
+                diffY = x2.size(2) - x1.size(2)
+                diffX = x2.size(3) - x1.size(3)
+                x1 = F.pad(x1, [diffX // 2, diffX - diffX // 2,
+                                diffY // 2, diffY - diffY // 2])
         
         x = torch.cat([x2, x1], dim=1)
         return self.conv(x)
@@ -100,14 +145,14 @@ class OutConv(nn.Module):
 class UNetEncoder(nn.Module):
     """U-Net Encoder"""
     
-    def __init__(self, n_channels=3, base_channels=64):
+    def __init__(self, n_channels=3, base_channels=64, factor=1):
         super().__init__()
         
         self.inc = DoubleConv(n_channels, base_channels)
         self.down1 = Down(base_channels, base_channels * 2)
         self.down2 = Down(base_channels * 2, base_channels * 4)
         self.down3 = Down(base_channels * 4, base_channels * 8)
-        self.down4 = Down(base_channels * 8, base_channels * 16)
+        self.down4 = Down(base_channels * 8, base_channels * 16 // factor)
     
     def forward(self, x):
         x1 = self.inc(x)
@@ -121,25 +166,30 @@ class UNetEncoder(nn.Module):
 class SiameseUNet(nn.Module):
     """Siamese U-Net Architecture"""
     
-    def __init__(self, n_channels=3, n_classes=2, base_channels=64, bilinear=True):
+    def __init__(self, n_channels=3, n_classes=2, base_channels=64, bilinear=True, diff_conv=True):
         super().__init__()
         
         self.n_channels = n_channels
         self.n_classes = n_classes
         self.bilinear = bilinear
         
-        # Shared encoder
-        self.encoder = UNetEncoder(n_channels, base_channels)
-        
-        # Difference module
-        self.diff_conv = nn.Sequential(
-            nn.Conv2d(base_channels * 16, base_channels * 16, 3, padding=1),
-            nn.BatchNorm2d(base_channels * 16),
-            nn.ReLU(inplace=True)
-        )
+        # Shared encoder (bottleneck narrowed with bilinear upsampling, whose
+        # Up blocks do not halve the channels before concatenation)
+        factor = 2 if bilinear else 1
+        self.encoder = UNetEncoder(n_channels, base_channels, factor)
+        
+        # Difference module; up1's DoubleConv already mixes the bottleneck
+        # difference, so models trained without it skip a full conv stage
+        if diff_conv:
+            self.diff_conv = nn.Sequential(
+                nn.Conv2d(base_channels * 16 // factor, base_channels * 16 // factor, 3, padding=1),
+                nn.BatchNorm2d(base_channels * 16 // factor),
+                nn.ReLU(inplace=True)
+            )
+        else:
+            self.diff_conv = nn.Identity()
         
         # Decoder for change detection
-        factor = 2 if bilinear else 1
         self.up1 = Up(base_channels * 16, base_channels * 8 // factor, bilinear)
         self.up2 = Up(base_channels * 8, base_channels * 4 // factor, bilinear)
         self.up3 = Up(base_channels * 4, base_channels * 2 // factor, bilinear)
@@ -147,15 +197,15 @@ class SiameseUNet(nn.Module):
         self.outc = OutConv(base_channels, n_classes)
     
     def forward(self, before, after):
-        # Extract features from both images using shared encoder
-        before_features = self.encoder(before)  # x1, x2, x3, x4, x5
-        after_features = self.encoder(after)
-        
+        # Extract features from both images in one pass of the shared encoder
+        n = before.size(0)
+        features = self.encoder(torch.cat([before, after], dim=0))  # x1, x2, x3, x4, x5
+        return self.decode_pair([f[:n] for f in features], [f[n:] for f in features])
+    
+    def decode_pair(self, before_features: List[torch.Tensor], after_features: List[torch.Tensor]) -> torch.Tensor:
+        """Change logits from the encoder features of the two images"""
         # Compute differences at each scale
-        diff_features = []
-        for bf, af in zip(before_features, after_features):
-            diff = torch.abs(bf - af)  # Absolute difference
-            diff_features.append(diff)
+        diff_features = [abs_diff(bf, af) for bf, af in zip(before_features, after_features)]  # Absolute difference
         
         # Apply additional processing to the bottleneck difference
         x5_diff = self.diff_conv(diff_features[4])
@@ -196,7 +246,10 @@ class AttentionGate(nn.Module):
     def forward(self, g, x):
         g1 = self.W_g(g)
         x1 = self.W_x(x)
-        psi = self.relu(g1 + x1)
+        # The gating signal comes from the coarser decoder level
+        g1 = F.interpolate(g1, size=x1.shape[-2:], mode='bilinear', align_corners=True)
+        # g1 is a fresh interpolation result, so accumulate into it in place
+        psi = self.relu(g1.add_(x1))
         psi = self.psi(psi)
         
         return x * psi
@@ -219,24 +272,35 @@ class EnhancedSiameseUNet(nn.Module):
         self.att3 = AttentionGate(base_channels * 4, base_channels * 2, base_channels)
         self.att4 = AttentionGate(base_channels * 2, base_channels, base_channels // 2)
         
-        # Decoder with attention
-        self.up1 = Up(base_channels * 16, base_channels * 8)
-        self.up2 = Up(base_channels * 8, base_channels * 4)
-        self.up3 = Up(base_channels * 4, base_channels * 2)
-        self.up4 = Up(base_channels * 2, base_channels)
+        # Decoder with attention (inputs are the upsampled features
+        # concatenated with the gated skip connection)
+        self.up1 = Up(base_channels * 16 + base_channels * 8, base_channels * 8)
+        self.up2 = Up(base_channels * 8 + base_channels * 4, base_channels * 4)
+        self.up3 = Up(base_channels * 4 + base_channels * 2, base_channels * 2)
+        self.up4 = Up(base_channels * 2 + base_channels, base_channels)
         self.outc = OutConv(base_channels, n_classes)
     
     def forward(self, before, after):
-        # Extract features
-        bf1, bf2, bf3, bf4, bf5 = self.encoder(before)
-        af1, af2, af3, af4, af5 = self.encoder(after)
-        
+        # Extract features (before and after share one encoder pass)
+        n = before.size(0)
+        features = self.encoder(torch.cat([before, after], dim=0))
+        return self.decode_pair([f[:n] for f in features], [f[n:] for f in features])
+    
+    def decode_pair(self, before_features: List[torch.Tensor], after_features: List[torch.Tensor]) -> torch.Tensor:
+        """Change logits from the encoder features of the two images"""
         # Compute differences
-        diff1 = torch.abs(bf1 - af1)
-        diff2 = torch.abs(bf2 - af2)
-        diff3 = torch.abs(bf3 - af3)
-        diff4 = torch.abs(bf4 - af4)
-        diff5 = torch.abs(bf5 - af5)
+        diff1 = abs_diff(before_features[0], after_features[0])
+        diff2 = abs_diff(before_features[1], after_features[1])
+        diff3 = abs_diff(before_features[2], after_features[2])
+        diff4 = abs_diff(before_features[3], after_features[3])
+        diff5 = abs_diff(before_features[4], after_features[4])
+        
+        # Each skip difference is read by an attention gate and an Up block
+        diff1 = diff1.contiguous(memory_format=torch.channels_last)
+        diff2 = diff2.contiguous(memory_format=torch.channels_last)
+        diff3 = diff3.contiguous(memory_format=torch.channels_last)
+        diff4 = diff4.contiguous(memory_format=torch.channels_last)
+        diff5 = diff5.contiguous(memory_format=torch.channels_last)
         
         # Decode with attention
         x = self.up1(diff5, self.att1(diff5, diff4))
@@ -250,30 +314,46 @@ class EnhancedSiameseUNet(nn.Module):
 class SiamUNetModel(BaseChangeDetectionModel):
     """Siam-UNet Model Wrapper"""
     
-    def __init__(self, img_size=256, num_classes=2, enhanced=True, device=None):
+    def __init__(self, img_size=256, num_classes=2, enhanced=True, device=None, feature_cache_size=0,
+                 diff_conv=True):
         super().__init__()
         
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.img_size = img_size
         self.num_classes = num_classes
         self.enhanced = enhanced
+        self.diff_conv = diff_conv
         self.version = "1.0"
         
-        # Initialize model
+        # Initialize model (diff_conv=False only matches checkpoints trained without
+        # the bottleneck difference conv; the enhanced network has none)
         if enhanced:
             self.model = EnhancedSiameseUNet(n_channels=3, n_classes=num_classes)
         else:
-            self.model = SiameseUNet(n_channels=3, n_classes=num_classes)
+            self.model = SiameseUNet(n_channels=3, n_classes=num_classes, diff_conv=diff_conv)
         
-        self.model.to(self.device)
+        self.model.to(self.device, memory_format=torch.channels_last)
         self.model.eval()
         
-        # Image preprocessing
-        self.transform = transforms.Compose([
-            transforms.Resize((img_size, img_size)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Modules used for inference; replaced by compiled graphs in load_pretrained
+        self.inference_model = self.model
+        self.inference_encoder = self.model.encoder
+        self.model_int8 = None
+        
+        # Encoder features keyed by image content hash, so a reference image
+        # compared against many candidates is only encoded once (LRU, bounded;
+        # each entry holds the full feature pyramid, so keep this small). Off by
+        # default: cached requests decode eagerly instead of through the compiled
+        # full model, so enable it only when reference images are reused
+        self.feature_cache = OrderedDict()
+        self.feature_cache_size = feature_cache_size
+        self.use_feature_cache = feature_cache_size > 0
+        
+        # Image preprocessing (normalization constants in 0-255 scale, created once)
+        self.mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1) * 255
+        # Uploads go on their own stream so they overlap the previous inference
+        self._upload_stream = torch.cuda.Stream(device=self.device) if self.device.type == 'cuda' else None
         
         model_type = "Enhanced Siam-UNet" if enhanced else "Siam-UNet"
         logger.info(f"{model_type} model initialized on {self.device}")
@@ -299,44 +379,192 @@ class SiamUNetModel(BaseChangeDetectionModel):
         except Exception as e:
             logger.warning(f"Could not load pretrained weights: {str(e)}")
             logger.info("Using randomly initialized weights")
+        
+        # Optimize whichever weights are now in place
+        self._optimize_for_serving()
+    
+    def _optimize_for_serving(self):
+        """Fold BN, compile the serving graph and warm the CPU kernels (the eager model serves if this fails)"""
+        try:
+            self._fuse_bn()
+            
+            # Compile after weights are in place; input shape is fixed at img_size
+            if not (os.environ.get("GSS_USE_TRT") == "1" and self.optimize_for_inference()):
+                # Only the graph the serving path uses is compiled: the encoder
+                # with the feature cache, the full forward otherwise
+                example = torch.zeros(1, 3, self.img_size, self.img_size, device=self.device)
+                example = example.contiguous(memory_format=torch.channels_last)
+                if self.use_feature_cache:
+                    module, examples = self.model.encoder, (example,)
+                else:
+                    module, examples = self.model, (example, example)
+                
+                compiled = compile_for_inference(module, examples)
+                if compiled is module:
+                    # torch.compile disabled or unavailable: fall back to TorchScript
+                    compiled = script_for_inference(module)
+                
+                if self.use_feature_cache:
+                    self.inference_encoder = compiled
+                else:
+                    self.inference_model = compiled
+            
+            if self.device.type == 'cpu' and _binary_change_stats is not None:
+                # JIT-compile the statistics kernel now, not on the first request, for
+                # both logit layouts the inference backends produce (NCHW, channels_last)
+                logits = torch.zeros(1, 2, 2, 2)
+                for layout in (torch.contiguous_format, torch.channels_last):
+                    _binary_change_stats(logits.contiguous(memory_format=layout)[0].numpy(), 0.5,
+                                         np.empty((2, 2), dtype=np.uint8))
+            
+            # INT8 on CPU when calibration tiles are provided
+            calibration_dir = os.environ.get("GSS_INT8_CALIBRATION_DIR")
+            if self.device.type == 'cpu' and calibration_dir:
+                images = load_calibration_images(calibration_dir)
+                self.quantize_for_cpu(list(zip(images, images[1:])))
+            
+        except Exception as e:
+            logger.warning(f"Inference optimization failed, serving the eager model: {str(e)}")
+            self.inference_model = self.model
+            self.inference_encoder = self.model.encoder
+    
+    def optimize_for_inference(self) -> bool:
+        """Swap in a TensorRT engine for inference (CUDA only); returns True on success"""
+        if self.device.type != 'cuda':
+            logger.info("TensorRT requires CUDA, keeping PyTorch inference")
+            return False
+        
+        model_name = "enhanced_siam_unet" if self.enhanced else "siam_unet"
+        input_shape = (1, 3, self.img_size, self.img_size)
+        trt_model = compile_tensorrt(self.model, (input_shape, input_shape),
+                                     f"{model_name}_{self.img_size}_trt.ts")
+        if trt_model is None:
+            return False
+        
+        self.inference_model = trt_model
+        # The engine covers the whole forward, so encoder features are not exposed
+        self.use_feature_cache = False
+        logger.info("Siam-UNet running on TensorRT")
+        return True
+    
+    def quantize_for_cpu(self, calibration_pairs: List[Tuple[Image.Image, Image.Image]]) -> bool:
+        """
+        Post-training static INT8 quantization (FX graph mode) for CPU inference
+        
+        Observers are calibrated on the given image pairs. On success the
+        INT8 model serves all requests.
+        
+        Args:
+            calibration_pairs: Representative (before, after) satellite tiles (~50)
+            
+        Returns:
+            True if the INT8 model is in use
+        """
+        if self.device.type != 'cpu' or not calibration_pairs:
+            return False
+        
+        try:
+            from torch.ao.quantization import get_default_qconfig_mapping
+            from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+            
+            example = self.preprocess_images(*calibration_pairs[0])
+            prepared = prepare_fx(copy.deepcopy(self.model).eval(), get_default_qconfig_mapping('x86'), example)
+            with torch.inference_mode():
+                for before_img, after_img in calibration_pairs:
+                    prepared(*self.preprocess_images(before_img, after_img))
+            
+            self.model_int8 = convert_fx(prepared)
+            self.inference_model = self.model_int8
+            # Cached FP32 features would bypass the INT8 graph
+            self.use_feature_cache = False
+            logger.info(f"Siam-UNet quantized to INT8 ({len(calibration_pairs)} calibration pairs)")
+            return True
+            
+        except Exception as e:
+            logger.warning(f"INT8 quantization failed, keeping FP32 model: {str(e)}")
+            return False
+    
+    def _fuse_bn(self):
+        """Fold eval-mode BatchNorm into the preceding convs (DoubleConv blocks, difference module, attention gates)"""
+        fused = fuse_conv_bn(self.model)
+        logger.info(f"Folded {fused} BatchNorm layers into Siam-UNet convolutions")
     
     def preprocess_images(self, before_img: Image.Image, after_img: Image.Image) -> Tuple[torch.Tensor, torch.Tensor]:
         """Preprocess image pair for Siam-UNet"""
-        before_tensor = self.transform(before_img).unsqueeze(0).to(self.device)
-        after_tensor = self.transform(after_img).unsqueeze(0).to(self.device)
+        before_tensor = self._to_tensor(before_img)
+        after_tensor = self._to_tensor(after_img)
         return before_tensor, after_tensor
     
+    def _to_tensor(self, img: Image.Image) -> torch.Tensor:
+        """Upload an image as uint8 and resize/normalize it on the model device"""
+        return image_to_device_tensor(img, (self.img_size, self.img_size), self.device, self.mean, self.std,
+                                      stream=self._upload_stream)
+    
+    def get_pair_features(self, before_img: Image.Image,
+                          after_img: Image.Image) -> Tuple[List[torch.Tensor], List[torch.Tensor]]:
+        """Encoder features for an image pair, served from the content-hash cache when possible"""
+        imgs = (before_img, after_img)
+        keys = [hashlib.blake2b(f"{img.mode}:{img.size}".encode() + img.tobytes(), digest_size=16).digest()
+                for img in imgs]
+        features = [self.feature_cache.get(key) for key in keys]
+        
+        # Encode the uncached images together in one batch
+        misses = [i for i, f in enumerate(features) if f is None]
+        if misses:
+            tensor = torch.cat([self._to_tensor(imgs[i]) for i in misses], dim=0)
+            with torch.inference_mode(), inference_autocast(self.device):
+                encoded = self.inference_encoder(tensor)
+                for j, i in enumerate(misses):
+                    # Clone: compiled graphs may reuse their output buffers on the next call
+                    features[i] = [f[j:j + 1].clone() for f in encoded]
+        
+        for key, f in zip(keys, features):
+            self.feature_cache[key] = f
+            self.feature_cache.move_to_end(key)
+        while len(self.feature_cache) > self.feature_cache_size:
+            self.feature_cache.popitem(last=False)
+        return features[0], features[1]
+    
     async def detect_binary_changes(self, before_img: Image.Image, after_img: Image.Image,
                                   threshold: float = 0.5) -> Dict[str, Any]:
         """Detect binary changes using Siam-UNet"""
         try:
-            # Preprocess images
-            before_tensor, after_tensor = self.preprocess_images(before_img, after_img)
+            if self.use_feature_cache:
+                # Encode each image once (cached), then decode the pair
+                before_features, after_features = self.get_pair_features(before_img, after_img)
+            else:
+                # Preprocess images
+                before_tensor, after_tensor = self.preprocess_images(before_img, after_img)
             
-            # Run inference
-            with torch.no_grad():
-                change_logits = self.model(before_tensor, after_tensor)
-                change_probs = F.softmax(change_logits, dim=1)
-                change_map = (change_probs[:, 1] > threshold).float()
-            
-            # Convert to numpy
-            change_map_np = change_map.squeeze().cpu().numpy()
-            change_probs_np = change_probs.squeeze().cpu().numpy()
-            
-            # Calculate change percentage
-            total_pixels = change_map_np.shape[0] * change_map_np.shape[1]
-            changed_pixels = np.sum(change_map_np > 0)
-            change_percentage = (changed_pixels / total_pixels) * 100
-            
-            # Calculate confidence score
-            confidence_score = float(np.mean(np.max(change_probs_np, axis=0)))
+            # Run inference (mixed precision on CUDA; softmax and threshold in FP32)
+            with torch.inference_mode():
+                with inference_autocast(self.device):
+                    if self.use_feature_cache:
+                        change_logits = self.model.decode_pair(before_features, after_features)
+                    else:
+                        change_logits = self.inference_model(before_tensor, after_tensor)
+                
+                if self.device.type == 'cpu' and self.num_classes == 2 and _binary_change_stats is not None:
+                    # Softmax, threshold and both statistics in one parallel pass
+                    change_map_np = np.empty(change_logits.shape[-2:], dtype=np.uint8)
+                    changed, confidence = _binary_change_stats(change_logits[0].float().numpy(), float(threshold),
+                                                               change_map_np)
+                    change_percentage = changed * 100.0 / change_map_np.size
+                    confidence_score = confidence / change_map_np.size
+                else:
+                    change_probs = F.softmax(change_logits.float(), dim=1)
+                    change_map = change_probs[:, 1] > threshold
+                    
+                    # Reduce on device; only the uint8 change map is copied to host
+                    change_percentage = float(change_map.float().mean() * 100)
+                    confidence_score = float(change_probs.max(dim=1).values.mean())
+                    change_map_np = change_map.squeeze(0).to(torch.uint8).cpu().numpy()
             
             # Generate visualization
-            change_map_viz = self.generate_change_visualization(change_map_np)
-            change_map_base64 = encode_image_to_base64(change_map_viz)
+            change_map_base64 = encode_array_to_base64(self._change_visualization_array(change_map_np))
             
             return {
-                "change_percentage": float(change_percentage),
+                "change_percentage": change_percentage,
                 "change_map_base64": change_map_base64,
                 "change_map": change_map_np,
                 "confidence_score": confidence_score,
@@ -370,18 +598,17 @@ class SiamUNetModel(BaseChangeDetectionModel):
         
         return binary_result
     
+    def _change_visualization_array(self, change_map: np.ndarray) -> np.ndarray:
+        """RGB uint8 visualization of a change map"""
+        # Blue for changes, white for no change (red and green are identical)
+        changed = (change_map * 255).astype(np.uint8)
+        unchanged = 255 - changed
+        return np.stack([unchanged, unchanged, changed], axis=-1)
+    
     def generate_change_visualization(self, change_map: np.ndarray) -> Image.Image:
         """Generate colored visualization of change map"""
         # Create RGB visualization with different color scheme than ChangeFormer
-        h, w = change_map.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        # Blue for changes, white for no change
-        viz[:, :, 0] = ((1 - change_map) * 255).astype(np.uint8)  # Red channel
-        viz[:, :, 1] = ((1 - change_map) * 255).astype(np.uint8)  # Green channel
-        viz[:, :, 2] = (change_map * 255).astype(np.uint8)  # Blue channel (changes in blue)
-        
-        return Image.fromarray(viz)
+        return Image.fromarray(self._change_visualization_array(change_map))
     
     async def perform_segmentation(self, before_img: Image.Image, after_img: Image.Image) -> Dict[str, Any]:
         """Perform segmentation using Siam-UNet"""
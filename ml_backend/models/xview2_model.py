@@ -13,21 +13,29 @@ Features:
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.transforms as transforms
 import numpy as np
 from PIL import Image
 import base64
 import io
 import cv2
+import hashlib
+from collections import OrderedDict
+import matplotlib
 from typing import Dict, Any, Tuple, Optional, List
 import logging
 import asyncio
 
 from .base_model import BaseChangeDetectionModel
-from ..utils.model_utils import download_pretrained_weights, encode_image_to_base64
+from ..utils.model_utils import (
+    download_pretrained_weights, encode_image_to_base64, image_to_device_tensor, fuse_conv_bn,
+    inference_autocast, compile_for_inference, script_for_inference
+)
 
 logger = logging.getLogger(__name__)
 
+# Severity colors: the 'Reds' colormap sampled once at the four damage levels
+_SEVERITY_LUT = (matplotlib.colormaps['Reds'](np.linspace(0, 1, 4))[:, :3] * 255).astype(np.uint8)
+
 class XView2DamageClassifier(nn.Module):
     """xView2 Building Damage Classifier"""
     
@@ -104,9 +112,9 @@ class XView2DamageClassifier(nn.Module):
         )
     
     def forward(self, pre_disaster, post_disaster):
-        # Extract features from both images
-        pre_features = self.backbone(pre_disaster)
-        post_features = self.backbone(post_disaster)
+        # Extract features from both images in one batched backbone pass
+        features = self.backbone(torch.cat([pre_disaster, post_disaster], dim=0))
+        pre_features, post_features = features.chunk(2, dim=0)
         
         # Fuse features
         fused_features = torch.cat([pre_features, post_features], dim=1)
@@ -134,11 +142,32 @@ class XView2DamageClassifier(nn.Module):
             'global_damage_logits': global_damage_logits,
             'fused_features': fused_features
         }
+    
+    def fuse_bn(self) -> int:
+        """Fold eval-mode BatchNorm into the preceding convs (fusion/head Sequentials, backbone stem and downsamples)"""
+        return fuse_conv_bn(self)
+
+# Damage colors by class id, plus a last row (dark gray) for non-building pixels
+_DAMAGE_PALETTE = np.array([XView2DamageClassifier.DAMAGE_COLORS[i]
+                            for i in range(len(XView2DamageClassifier.DAMAGE_COLORS))] + [[64, 64, 64]],
+                           dtype=np.uint8)
+_BACKGROUND_INDEX = len(_DAMAGE_PALETTE) - 1
+
+# Binary change map colors
+_CHANGE_COLOR = np.array([255, 0, 0], dtype=np.uint8)
+_NO_CHANGE_COLOR = np.array([0, 64, 64], dtype=np.uint8)
+
+# PNG zlib level for the base64 maps; these are flat-colored, so level 1
+# is several times faster than the default with little size difference
+_PNG_COMPRESS_LEVEL = 1
 
 class XView2Model(BaseChangeDetectionModel):
     """xView2 Model Wrapper for Disaster Damage Assessment"""
     
-    def __init__(self, img_size=512, backbone='resnet50', device=None):
+    # Larger images are not worth hashing for the assessment cache
+    ASSESSMENT_CACHE_MAX_PIXELS = 4096 * 4096
+    
+    def __init__(self, img_size=512, backbone='resnet50', device=None, assessment_cache_size=4):
         super().__init__()
         
         self.device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -151,13 +180,20 @@ class XView2Model(BaseChangeDetectionModel):
         self.model.to(self.device)
         self.model.eval()
         
-        # Image preprocessing for xView2 (satellite imagery specific)
-        self.transform = transforms.Compose([
-            transforms.Resize((img_size, img_size)),
-            transforms.ToTensor(),
-            # xView2 specific normalization (if available)
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # Module used for inference; replaced by a compiled graph in load_pretrained
+        self.inference_model = self.model
+        
+        # Assessments keyed by the pair's content hash, so running several analyses
+        # (binary, multi-class, damage) on the same pair runs the model once (LRU, bounded)
+        self.assessment_cache = OrderedDict()
+        self.assessment_cache_size = assessment_cache_size
+        
+        # Image preprocessing for xView2 (satellite imagery specific); normalization
+        # constants in 0-255 scale, created once on the model device
+        self.mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1) * 255
+        self.std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1) * 255
+        # Uploads go on their own stream so they overlap the previous inference
+        self._upload_stream = torch.cuda.Stream(device=self.device) if self.device.type == 'cuda' else None
         
         logger.info(f"xView2 ({backbone}) model initialized on {self.device}")
     
@@ -181,105 +217,209 @@ class XView2Model(BaseChangeDetectionModel):
         except Exception as e:
             logger.warning(f"Could not load pretrained weights: {str(e)}")
             logger.info("Using backbone pretrained weights only")
+        
+        # Optimize whichever weights are now in place
+        self._optimize_for_serving()
+    
+    def _optimize_for_serving(self):
+        """Fold BN and compile the pair forward (the eager model serves if this fails)"""
+        try:
+            self._fuse_bn()
+            
+            # Compile after weights are in place; input shape is fixed at img_size
+            example = torch.zeros(1, 3, self.img_size, self.img_size, device=self.device)
+            self.inference_model = compile_for_inference(self.model, (example, example))
+            if self.inference_model is self.model:
+                # torch.compile disabled or unavailable: fall back to TorchScript
+                self.inference_model = script_for_inference(self.model)
+            
+        except Exception as e:
+            logger.warning(f"Inference optimization failed, serving the eager model: {str(e)}")
+            self.inference_model = self.model
+    
+    def _fuse_bn(self):
+        """Fold BatchNorm into the classifier convolutions once the weights are in place"""
+        fused = self.model.fuse_bn()
+        logger.info(f"Folded {fused} BatchNorm layers into xView2 convolutions")
     
     def preprocess_images(self, pre_disaster: Image.Image, post_disaster: Image.Image) -> Tuple[torch.Tensor, torch.Tensor]:
         """Preprocess image pair for xView2 model"""
-        pre_tensor = self.transform(pre_disaster).unsqueeze(0).to(self.device)
-        post_tensor = self.transform(post_disaster).unsqueeze(0).to(self.device)
+        pre_tensor = self._to_tensor(pre_disaster)
+        post_tensor = self._to_tensor(post_disaster)
         return pre_tensor, post_tensor
     
-    async def assess_building_damage(self, pre_disaster: Image.Image, post_disaster: Image.Image) -> Dict[str, Any]:
-        """Assess building damage using xView2 model"""
+    def _to_tensor(self, img: Image.Image) -> torch.Tensor:
+        """Upload an image as uint8 and resize/normalize it on the model device"""
+        return image_to_device_tensor(img, (self.img_size, self.img_size), self.device, self.mean, self.std,
+                                      stream=self._upload_stream)
+    
+    async def assess_building_damage(self, pre_disaster: Image.Image, post_disaster: Image.Image,
+                                     generate_visualizations: bool = True) -> Dict[str, Any]:
+        """
+        Assess building damage using xView2 model
+        
+        Args:
+            pre_disaster: Image before the event
+            post_disaster: Image after the event
+            generate_visualizations: Render the base64 damage/building/severity maps;
+                when False those keys are None (for callers that only need the maps and statistics)
+        """
         try:
-            # Preprocess images
-            pre_tensor, post_tensor = self.preprocess_images(pre_disaster, post_disaster)
-            
-            # Run inference
-            with torch.no_grad():
-                outputs = self.model(pre_tensor, post_tensor)
-                
-                # Building segmentation
-                building_probs = F.softmax(outputs['building_logits'], dim=1)
-                building_mask = torch.argmax(building_probs, dim=1)
-                
-                # Damage classification
-                damage_probs = F.softmax(outputs['damage_logits'], dim=1)
-                damage_map = torch.argmax(damage_probs, dim=1)
-                
-                # Global damage assessment
-                global_damage_probs = F.softmax(outputs['global_damage_logits'], dim=1)
-                global_damage_class = torch.argmax(global_damage_probs, dim=1)
-            
-            # Convert to numpy
-            building_mask_np = building_mask.squeeze().cpu().numpy()
-            damage_map_np = damage_map.squeeze().cpu().numpy()
-            damage_probs_np = damage_probs.squeeze().cpu().numpy()
-            global_damage_probs_np = global_damage_probs.squeeze().cpu().numpy()
+            key = self._pair_fingerprint(pre_disaster, post_disaster)
+            if key is not None and key in self.assessment_cache:
+                self.assessment_cache.move_to_end(key)
+                result = self.assessment_cache[key]
+            else:
+                result = self._assess(pre_disaster, post_disaster)
+                if key is not None:
+                    self.assessment_cache[key] = result
+                    if len(self.assessment_cache) > self.assessment_cache_size:
+                        self.assessment_cache.popitem(last=False)
             
-            # Apply building mask to damage map (only assess damage where buildings exist)
-            masked_damage_map = damage_map_np * building_mask_np
+            if generate_visualizations and result["damage_map_base64"] is None:
+                # Rendered once per cached pair, on the first request that needs them
+                self._render_visualizations(result)
             
-            # Calculate building statistics
-            building_pixels = np.sum(building_mask_np > 0)
-            total_pixels = building_mask_np.size
+            # Shallow copy so callers can annotate the result without touching the cache
+            return dict(result)
             
-            # Calculate damage statistics
-            damage_stats = {}
-            for damage_id, damage_name in XView2DamageClassifier.DAMAGE_CLASSES.items():
-                damage_pixels = np.sum(masked_damage_map == damage_id)
-                if building_pixels > 0:
-                    damage_percentage = (damage_pixels / building_pixels) * 100
-                else:
-                    damage_percentage = 0.0
+        except Exception as e:
+            logger.error(f"Error in building damage assessment: {str(e)}")
+            raise
+    
+    def _assess(self, pre_disaster: Image.Image, post_disaster: Image.Image) -> Dict[str, Any]:
+        """Run the model on an image pair and compute the damage maps and statistics (no visualizations)"""
+        # Preprocess images
+        pre_tensor, post_tensor = self.preprocess_images(pre_disaster, post_disaster)
+        
+        # Run inference (reduced precision on CUDA); the pixel heads come out of
+        # the graph already upsampled to the input size
+        with torch.inference_mode():
+            with inference_autocast(self.device):
+                outputs = self.inference_model(pre_tensor, post_tensor)
                 
-                damage_stats[damage_name] = {
-                    'pixels': int(damage_pixels),
-                    'percentage': float(damage_percentage)
-                }
-            
-            # Generate visualizations
-            damage_viz = self.generate_damage_visualization(masked_damage_map, building_mask_np)
-            damage_base64 = encode_image_to_base64(damage_viz)
-            
-            building_viz = self.generate_building_visualization(building_mask_np)
-            building_base64 = encode_image_to_base64(building_viz)
+                # Class maps straight from the logits (softmax does not change the argmax)
+                building_mask = torch.argmax(outputs['building_logits'], dim=1)
+                damage_map = torch.argmax(outputs['damage_logits'], dim=1)
+                global_damage_class = torch.argmax(outputs['global_damage_logits'], dim=1)
+                
+                # Confidences reduced on device without materializing probabilities: the
+                # max softmax probability is exp(max logit - logsumexp), with autocast
+                # running logsumexp in FP32
+                damage_logits = outputs['damage_logits']
+                global_logits = outputs['global_damage_logits']
+                confidences = torch.stack([
+                    torch.exp(damage_logits.amax(dim=1).float() - torch.logsumexp(damage_logits, dim=1)).mean(),
+                    torch.exp(global_logits.amax(dim=1).float() - torch.logsumexp(global_logits, dim=1))[0]
+                ])
             
-            severity_viz = self.generate_severity_visualization(masked_damage_map)
-            severity_base64 = encode_image_to_base64(severity_viz)
+            # Apply building mask to damage map (only assess damage where buildings exist)
+            masked_damage = damage_map * building_mask
             
-            # Calculate confidence scores
-            damage_confidence = float(np.mean(np.max(damage_probs_np, axis=0)))
-            global_confidence = float(np.max(global_damage_probs_np))
+            # Reduce the statistics on device so only the counts are transferred
+            # (all damage class counts in one bincount pass)
+            damage_counts = torch.bincount(masked_damage.flatten(),
+                                           minlength=len(XView2DamageClassifier.DAMAGE_CLASSES))
             
-            # Overall damage assessment
-            overall_damage_class = XView2DamageClassifier.DAMAGE_CLASSES[int(global_damage_class.item())]
+            # Pack what the host needs into two tensors: the maps (class ids fit in
+            # uint8) and the scalars (float64 holds the pixel counts exactly)
+            maps = torch.cat([building_mask, masked_damage]).to(torch.uint8)
+            scalars = torch.cat([damage_counts.double(), torch.count_nonzero(building_mask).double().view(1),
+                                 global_damage_class.double(), confidences.double()])
+        
+        # Maps are still needed for the visualizations
+        (building_mask_np, masked_damage_map), scalars = self._to_host(maps, scalars)
+        *damage_counts, building_pixels, global_damage_class, damage_confidence, global_confidence = scalars.tolist()
+        
+        total_pixels = building_mask_np.size
+        
+        # Calculate damage statistics
+        damage_stats = {}
+        for damage_id, damage_name in XView2DamageClassifier.DAMAGE_CLASSES.items():
+            damage_pixels = damage_counts[damage_id]
+            if building_pixels > 0:
+                damage_percentage = (damage_pixels / building_pixels) * 100
+            else:
+                damage_percentage = 0.0
             
-            return {
-                "damage_map_base64": damage_base64,
-                "building_map_base64": building_base64,
-                "severity_map_base64": severity_base64,
-                "building_count": int(building_pixels),
-                "total_pixels": int(total_pixels),
-                "damage_statistics": damage_stats,
-                "overall_damage_assessment": overall_damage_class,
-                "confidence_score": damage_confidence,
-                "global_confidence": global_confidence,
-                "damage_map": masked_damage_map,
-                "building_mask": building_mask_np,
-                "model_type": "xview2",
-                "analysis_type": "damage_assessment"
+            damage_stats[damage_name] = {
+                'pixels': int(damage_pixels),
+                'percentage': float(damage_percentage)
             }
-            
-        except Exception as e:
-            logger.error(f"Error in building damage assessment: {str(e)}")
-            raise
+        
+        # Overall damage assessment
+        overall_damage_class = XView2DamageClassifier.DAMAGE_CLASSES[int(global_damage_class)]
+        
+        return {
+            # Visualizations are rendered on demand by _render_visualizations
+            "damage_map_base64": None,
+            "building_map_base64": None,
+            "severity_map_base64": None,
+            "building_count": int(building_pixels),
+            "total_pixels": int(total_pixels),
+            "damage_statistics": damage_stats,
+            "overall_damage_assessment": overall_damage_class,
+            "confidence_score": damage_confidence,
+            "global_confidence": global_confidence,
+            "damage_map": masked_damage_map,
+            "building_mask": building_mask_np,
+            "model_type": "xview2",
+            "analysis_type": "damage_assessment"
+        }
+    
+    def _to_host(self, *tensors: torch.Tensor) -> List[np.ndarray]:
+        """
+        Copy device tensors to host numpy arrays with a single synchronization
+        
+        On CUDA each tensor is copied asynchronously into pinned memory and the
+        stream is synchronized once; the arrays are zero-copy views of those buffers.
+        """
+        if self.device.type != 'cuda':
+            return [t.numpy() for t in tensors]
+        
+        staged = [torch.empty(t.shape, dtype=t.dtype, pin_memory=True) for t in tensors]
+        for host, t in zip(staged, tensors):
+            host.copy_(t, non_blocking=True)
+        torch.cuda.current_stream(self.device).synchronize()
+        return [host.numpy() for host in staged]
+    
+    def _render_visualizations(self, result: Dict[str, Any]):
+        """Add the base64 damage, building and severity maps to an assessment result"""
+        damage_viz = self.generate_damage_visualization(result["damage_map"], result["building_mask"])
+        result["damage_map_base64"] = encode_image_to_base64(damage_viz, compress_level=_PNG_COMPRESS_LEVEL)
+        
+        building_viz = self.generate_building_visualization(result["building_mask"])
+        result["building_map_base64"] = encode_image_to_base64(building_viz, compress_level=_PNG_COMPRESS_LEVEL)
+        
+        severity_viz = self.generate_severity_visualization(result["damage_map"])
+        result["severity_map_base64"] = encode_image_to_base64(severity_viz, compress_level=_PNG_COMPRESS_LEVEL)
+    
+    def _pair_fingerprint(self, pre_disaster: Image.Image, post_disaster: Image.Image) -> Optional[bytes]:
+        """Content hash of an image pair, or None when it should not be cached"""
+        if self.assessment_cache_size <= 0:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for img in (pre_disaster, post_disaster):
+            if img.width * img.height > self.ASSESSMENT_CACHE_MAX_PIXELS:
+                return None
+            digest.update(f"{img.mode}:{img.size}".encode())
+            digest.update(img.tobytes())
+        return digest.digest()
+    
+    @staticmethod
+    def _damaged_pixels(damage_result: Dict[str, Any]) -> int:
+        """Pixels with any damage (damage class > 0), from the precomputed statistics"""
+        no_damage = XView2DamageClassifier.DAMAGE_CLASSES[0]
+        return sum(stats["pixels"] for name, stats in damage_result["damage_statistics"].items()
+                   if name != no_damage)
     
     async def detect_binary_changes(self, before_img: Image.Image, after_img: Image.Image,
                                   threshold: float = 0.5) -> Dict[str, Any]:
         """Detect changes using damage assessment (binary: damaged/not damaged)"""
         try:
-            # Run damage assessment
-            damage_result = await self.assess_building_damage(before_img, after_img)
+            # Run damage assessment (only the binary map is rendered)
+            damage_result = await self.assess_building_damage(before_img, after_img,
+                                                              generate_visualizations=False)
             
             # Convert to binary change map (any damage = change)
             damage_map = damage_result["damage_map"]
@@ -287,12 +427,12 @@ class XView2Model(BaseChangeDetectionModel):
             
             # Calculate change percentage
             total_pixels = binary_change_map.size
-            changed_pixels = np.sum(binary_change_map)
+            changed_pixels = self._damaged_pixels(damage_result)
             change_percentage = float(changed_pixels / total_pixels * 100)
             
             # Generate binary change visualization
             change_viz = self.generate_binary_change_visualization(binary_change_map)
-            change_base64 = encode_image_to_base64(change_viz)
+            change_base64 = encode_image_to_base64(change_viz, compress_level=_PNG_COMPRESS_LEVEL)
             
             return {
                 "change_percentage": change_percentage,
@@ -312,8 +452,11 @@ class XView2Model(BaseChangeDetectionModel):
                                       threshold: float = 0.5) -> Dict[str, Any]:
         """Detect multi-class changes (damage levels)"""
         try:
-            # Run damage assessment
-            damage_result = await self.assess_building_damage(before_img, after_img)
+            # Run damage assessment (only the damage map is rendered)
+            damage_result = await self.assess_building_damage(before_img, after_img,
+                                                              generate_visualizations=False)
+            damage_viz = self.generate_damage_visualization(damage_result["damage_map"],
+                                                            damage_result["building_mask"])
             
             # Use damage statistics as class predictions
             class_predictions = {}
@@ -323,12 +466,12 @@ class XView2Model(BaseChangeDetectionModel):
             # Overall change percentage (any damage)
             damage_map = damage_result["damage_map"]
             total_pixels = damage_map.size
-            changed_pixels = np.sum(damage_map > 0)
+            changed_pixels = self._damaged_pixels(damage_result)
             change_percentage = float(changed_pixels / total_pixels * 100)
             
             return {
                 "change_percentage": change_percentage,
-                "change_map_base64": damage_result["damage_map_base64"],
+                "change_map_base64": encode_image_to_base64(damage_viz, compress_level=_PNG_COMPRESS_LEVEL),
                 "class_predictions": class_predictions,
                 "damage_assessment": damage_result["damage_statistics"],
                 "overall_damage": damage_result["overall_damage_assessment"],
@@ -348,17 +491,10 @@ class XView2Model(BaseChangeDetectionModel):
     
     def generate_damage_visualization(self, damage_map: np.ndarray, building_mask: np.ndarray) -> Image.Image:
         """Generate colored visualization of damage map"""
-        h, w = damage_map.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        # Apply damage colors only where buildings exist
-        for damage_id, color in XView2DamageClassifier.DAMAGE_COLORS.items():
-            damage_pixels = (damage_map == damage_id) & (building_mask > 0)
-            viz[damage_pixels] = color
-        
-        # Background (non-building areas) in dark gray
-        background = building_mask == 0
-        viz[background] = [64, 64, 64]
+        # Damage colors where buildings exist, background (non-building areas)
+        # in dark gray, as a single palette lookup
+        indices = np.where(building_mask > 0, damage_map.astype(np.uint8), np.uint8(_BACKGROUND_INDEX))
+        viz = _DAMAGE_PALETTE[indices]
         
         return Image.fromarray(viz)
     
@@ -376,32 +512,16 @@ class XView2Model(BaseChangeDetectionModel):
     
     def generate_severity_visualization(self, damage_map: np.ndarray) -> Image.Image:
         """Generate severity heatmap visualization"""
-        h, w = damage_map.shape
-        
-        # Create severity map (higher values = more severe damage)
-        severity_map = damage_map.astype(np.float32) / 3.0  # Normalize to 0-1
-        
-        # Convert to heatmap (using matplotlib colormap approach)
-        import matplotlib.cm as cm
-        import matplotlib.colors as colors
-        
-        # Apply colormap
-        cmap = cm.get_cmap('Reds')
-        colored = cmap(severity_map)
-        
-        # Convert to RGB uint8
-        viz = (colored[:, :, :3] * 255).astype(np.uint8)
+        # Damage levels 0-3 index the severity lookup table directly
+        # (higher values = more severe damage)
+        viz = _SEVERITY_LUT[damage_map.astype(np.uint8, copy=False)]
         
         return Image.fromarray(viz)
     
     def generate_binary_change_visualization(self, change_map: np.ndarray) -> Image.Image:
         """Generate visualization for binary change map"""
-        h, w = change_map.shape
-        viz = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        # Red for changes, dark gray for no change
-        viz[:, :, 0] = (change_map * 255).astype(np.uint8)  # Red channel
-        viz[:, :, 1] = ((1 - change_map) * 64).astype(np.uint8)  # Green channel
-        viz[:, :, 2] = ((1 - change_map) * 64).astype(np.uint8)  # Blue channel
+        # Red for changes, dark gray (teal-tinted) for no change
+        changed = change_map.astype(bool)[..., None]
+        viz = np.where(changed, _CHANGE_COLOR, _NO_CHANGE_COLOR)
         
         return Image.fromarray(viz)
\ No newline at end of file
@@ -15,7 +15,6 @@ import torch
 import torchvision.transforms as transforms
 from typing import Dict, Any, Tuple, Optional, List
 import logging
-import asyncio
 import rasterio
 from rasterio.enums import Resampling
 import cv2
@@ -34,8 +33,8 @@ class DatasetProcessor:
             'generic': GenericProcessor()
         }
     
-    async def preprocess_image_pair(self, before_img: Image.Image, after_img: Image.Image, 
-                                  dataset_type: str) -> Tuple[Image.Image, Image.Image, Dict[str, Any]]:
+    def preprocess_image_pair(self, before_img: Image.Image, after_img: Image.Image, 
+                            dataset_type: str) -> Tuple[Image.Image, Image.Image, Dict[str, Any]]:
         """
         Preprocess image pair for specific dataset type
         
@@ -52,10 +51,10 @@ class DatasetProcessor:
             dataset_type = 'generic'
         
         processor = self.dataset_configs[dataset_type]
-        return await processor.preprocess_pair(before_img, after_img)
+        return processor.preprocess_pair(before_img, after_img)
     
-    async def preprocess_single_image(self, img: Image.Image, 
-                                    dataset_type: str) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single_image(self, img: Image.Image, 
+                              dataset_type: str) -> Tuple[Image.Image, Dict[str, Any]]:
         """
         Preprocess single image for specific dataset type
         
@@ -71,7 +70,7 @@ class DatasetProcessor:
             dataset_type = 'generic'
         
         processor = self.dataset_configs[dataset_type]
-        return await processor.preprocess_single(img)
+        return processor.preprocess_single(img)
 
 class BaseDatasetProcessor:
     """Base class for dataset processors"""
@@ -89,10 +88,10 @@ class BaseDatasetProcessor:
             'std': [0.229, 0.224, 0.225]
         }
     
-    async def preprocess_pair(self, before_img: Image.Image, after_img: Image.Image) -> Tuple[Image.Image, Image.Image, Dict[str, Any]]:
+    def preprocess_pair(self, before_img: Image.Image, after_img: Image.Image) -> Tuple[Image.Image, Image.Image, Dict[str, Any]]:
         """Preprocess image pair"""
-        before_processed, before_meta = await self.preprocess_single(before_img)
-        after_processed, after_meta = await self.preprocess_single(after_img)
+        before_processed, before_meta = self.preprocess_single(before_img)
+        after_processed, after_meta = self.preprocess_single(after_img)
         
         metadata = {
             'dataset_type': self.name,
@@ -105,7 +104,7 @@ class BaseDatasetProcessor:
         
         return before_processed, after_processed, metadata
     
-    async def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
         """Preprocess single image (to be implemented by subclasses)"""
         raise NotImplementedError
 
@@ -125,7 +124,7 @@ class Sentinel2Processor(BaseDatasetProcessor):
             'std': [0.229, 0.224, 0.225]
         }
     
-    async def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
         """Preprocess Sentinel-2 image"""
         try:
             # Convert to RGB if needed
@@ -204,7 +203,7 @@ class LandsatProcessor(BaseDatasetProcessor):
             'std': [0.23, 0.22, 0.21]
         }
     
-    async def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
         """Preprocess Landsat image"""
         try:
             # Convert to RGB if needed
@@ -283,7 +282,7 @@ class GlobalForestChangeProcessor(BaseDatasetProcessor):
             'std': [0.25, 0.23, 0.22]
         }
     
-    async def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
         """Preprocess Global Forest Change image"""
         try:
             # Convert to RGB if needed
@@ -372,7 +371,7 @@ class XView2Processor(BaseDatasetProcessor):
             'std': [0.229, 0.224, 0.225]
         }
     
-    async def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
         """Preprocess xView2 disaster image"""
         try:
             # Convert to RGB if needed
@@ -453,7 +452,7 @@ class GenericProcessor(BaseDatasetProcessor):
         bands = ['R', 'G', 'B']
         super().__init__('generic', bands, target_size=512)
     
-    async def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
+    def preprocess_single(self, img: Image.Image) -> Tuple[Image.Image, Dict[str, Any]]:
         """Basic preprocessing for unknown datasets"""
         try:
             # Convert to RGB if needed
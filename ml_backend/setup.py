@@ -115,6 +115,10 @@ DEBUG=true
 # Model Configuration  
 MODEL_CACHE_DIR=./model_cache
 MAX_IMAGE_SIZE=10485760  # 10MB
+# Siam-UNet variant: 0 serves the plain network; DIFF_CONV=0 drops its
+# bottleneck difference conv (only for weights trained without it)
+# GSS_SIAM_ENHANCED=1
+# GSS_SIAM_DIFF_CONV=1
 
 # CORS Configuration
 ALLOWED_ORIGINS=http://localhost:3000,http://localhost:5173,http://localhost:8080
@@ -0,0 +1,39 @@
+"""
+Shared fixtures for the ML backend tests
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Wrapper tests run on CPU with the TorchScript path; torch.compile adds
+# minutes of warm-up without changing the numerics under test
+os.environ.setdefault("GSS_TORCH_COMPILE", "0")
+os.environ.pop("GSS_USE_TRT", None)
+
+# The model modules use package-relative imports (ml_backend.models.*)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+import pytest
+import torch
+import torchvision.models as tvm
+from PIL import Image
+
+
+@pytest.fixture(autouse=True)
+def offline_backbones(monkeypatch):
+    """Build the ResNet backbones without downloading ImageNet weights"""
+    for name in ("resnet50", "resnet101"):
+        constructor = getattr(tvm, name)
+        monkeypatch.setattr(tvm, name, lambda pretrained=False, _c=constructor, **kw: _c(weights=None))
+    torch.manual_seed(0)
+
+
+@pytest.fixture
+def image_pair():
+    """Random RGB pair at a size that differs from every model's img_size"""
+    rng = np.random.default_rng(0)
+    before = Image.fromarray(rng.integers(0, 255, (90, 100, 3), dtype=np.uint8))
+    after = Image.fromarray(rng.integers(0, 255, (90, 100, 3), dtype=np.uint8))
+    return before, after
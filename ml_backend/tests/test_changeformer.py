@@ -0,0 +1,90 @@
+"""
+Tests for the ChangeFormer network and wrapper
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from ml_backend.models.changeformer import ChangeFormerModel, MultiHeadSelfAttention
+
+CPU = torch.device("cpu")
+
+
+def _explicit_attention(attn: MultiHeadSelfAttention, x: torch.Tensor) -> torch.Tensor:
+    """Self-attention with the N x N score matrix formed explicitly (the pre-SDPA formulation)"""
+    B, N, C = x.shape
+    qkv = attn.qkv(x).reshape(B, N, 3, attn.num_heads, attn.head_dim).permute(2, 0, 3, 1, 4)
+    q, k, v = qkv[0], qkv[1], qkv[2]
+    scores = ((q @ k.transpose(-2, -1)) * attn.scale).softmax(dim=-1)
+    return attn.proj((scores @ v).transpose(1, 2).reshape(B, N, C))
+
+
+def test_sdpa_attention_matches_explicit_softmax_attention():
+    attn = MultiHeadSelfAttention(dim=64, num_heads=4, qkv_bias=True, attn_drop=0.1).eval()
+    x = torch.randn(2, 50, 64)
+
+    with torch.inference_mode():
+        out = attn(x)
+        expected = _explicit_attention(attn, x)
+
+    assert out.shape == x.shape
+    assert out.dtype == x.dtype
+    torch.testing.assert_close(out, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_sdpa_attention_drops_out_only_in_training():
+    attn = MultiHeadSelfAttention(dim=32, num_heads=2, attn_drop=0.5)
+    x = torch.randn(1, 16, 32)
+
+    attn.train()
+    with torch.no_grad():
+        trained = attn(x)
+
+    attn.eval()
+    with torch.no_grad():
+        evaluated = attn(x)
+        torch.testing.assert_close(attn(x), evaluated)
+    assert not torch.allclose(trained, evaluated)
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.2, 0.5, 0.9, 1.0])
+def test_logit_margin_threshold_matches_softmax(threshold):
+    model = ChangeFormerModel(img_size=128, device=CPU)
+    logits = torch.randn(1, 2, 8, 8, generator=torch.Generator().manual_seed(0)) * 3
+
+    result = model._build_binary_result(logits, threshold)
+
+    probs = F.softmax(logits, dim=1)[0]
+    expected_map = (probs[1] > threshold).numpy()
+    assert result["change_map"].dtype == np.uint8
+    assert result["change_map"].shape == (8, 8)
+    np.testing.assert_array_equal(result["change_map"], expected_map)
+    assert result["change_percentage"] == pytest.approx(expected_map.mean() * 100)
+    assert result["confidence_score"] == pytest.approx(float(probs.max(dim=0).values.mean()), abs=1e-6)
+    assert isinstance(result["change_map_base64"], str)
+
+
+def test_feature_cache_matches_full_forward(image_pair):
+    before, after = image_pair
+    cached = ChangeFormerModel(img_size=128, device=CPU, feature_cache_size=4)
+    uncached = ChangeFormerModel(img_size=128, device=CPU)
+    uncached.model.load_state_dict(cached.model.state_dict())
+
+    async def run():
+        for wrapper in (cached, uncached):
+            await wrapper.load_pretrained()
+        first = await cached.detect_binary_changes(before, after)
+        again = await cached.detect_binary_changes(before, after)
+        expected = await uncached.detect_binary_changes(before, after)
+        return first, again, expected
+
+    first, again, expected = asyncio.run(run())
+
+    assert len(cached.feature_cache) == 2
+    np.testing.assert_array_equal(again["change_map"], first["change_map"])
+    assert np.mean(first["change_map"] != expected["change_map"]) <= 1e-3
+    assert first["confidence_score"] == pytest.approx(expected["confidence_score"], abs=1e-4)
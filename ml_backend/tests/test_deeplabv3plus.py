@@ -0,0 +1,36 @@
+"""
+Tests for the DeepLabV3+ wrapper
+"""
+
+import asyncio
+import copy
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from ml_backend.models.deeplabv3plus import DeepLabV3PlusModel
+
+CPU = torch.device("cpu")
+
+
+def test_segmentation_matches_eager_softmax(image_pair):
+    img = image_pair[0]
+    wrapper = DeepLabV3PlusModel(img_size=128, backbone="resnet50", device=CPU)
+    eager = copy.deepcopy(wrapper.model)
+
+    asyncio.run(wrapper.load_pretrained())
+    result = asyncio.run(wrapper.segment_land_cover(img))
+
+    with torch.inference_mode():
+        probs = F.softmax(eager(wrapper.preprocess_image(img)), dim=1)[0]
+    max_probs, expected_map = probs.max(dim=0)
+    segmentation_map = result["segmentation_map"]
+    assert segmentation_map.dtype == np.uint8
+    assert segmentation_map.shape == (128, 128)
+    assert np.mean(segmentation_map != expected_map.numpy()) <= 1e-3
+    assert result["confidence_score"] == pytest.approx(float(max_probs.mean()), abs=1e-4)
+    for class_id, class_name in wrapper.LAND_COVER_CLASSES.items():
+        expected = np.mean(segmentation_map == class_id) * 100
+        assert result["class_percentages"][class_name] == pytest.approx(expected)
@@ -0,0 +1,66 @@
+"""
+Tests for the shared inference helpers
+"""
+
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from ml_backend.utils.model_utils import InferenceBatcher, clean_change_map
+
+
+def test_padded_batches_match_unbatched_outputs():
+    seen_sizes = []
+
+    def forward(x1, x2):
+        seen_sizes.append(x1.shape[0])
+        return x1 * 2 + x2.sum(dim=1, keepdim=True)
+
+    batcher = InferenceBatcher(forward, max_batch_size=8, max_wait_ms=50, pad_batches=True)
+    inputs = [(torch.randn(1, 3), torch.randn(1, 3)) for _ in range(5)]
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(x1, x2) for x1, x2 in inputs))
+
+    outputs = asyncio.run(run())
+
+    assert batcher.batch_sizes == (1, 2, 4, 8)
+    assert seen_sizes and set(seen_sizes) <= set(batcher.batch_sizes)
+    for (x1, x2), out in zip(inputs, outputs):
+        torch.testing.assert_close(out, forward(x1, x2))
+
+
+def test_batch_outputs_survive_buffer_reuse():
+    # Compiled graphs hand back the same output buffer on every call
+    buffer = torch.empty(2, 3)
+
+    def forward(x):
+        buffer.copy_(x)
+        return buffer
+
+    batcher = InferenceBatcher(forward, max_batch_size=2, max_wait_ms=0, pad_batches=True)
+
+    async def run():
+        first = await batcher.submit(torch.zeros(1, 3))
+        await batcher.submit(torch.ones(1, 3))
+        return first
+
+    torch.testing.assert_close(asyncio.run(run()), torch.zeros(1, 3))
+
+
+@pytest.mark.parametrize("density", [0.1, 0.5, 0.9])
+def test_clean_change_map_matches_open_then_close(density):
+    rng = np.random.default_rng(0)
+    # Odd, non-square shape so changes touching every border are covered
+    change_map = (rng.random((37, 53)) < density).astype(np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+    expected = cv2.morphologyEx(change_map, cv2.MORPH_OPEN, kernel)
+    expected = cv2.morphologyEx(expected, cv2.MORPH_CLOSE, kernel)
+
+    cleaned = clean_change_map(change_map.astype(bool))
+    assert cleaned.dtype == np.uint8
+    np.testing.assert_array_equal(cleaned, expected)
@@ -0,0 +1,72 @@
+"""
+Tests for the Siam-UNet wrapper
+"""
+
+import asyncio
+import copy
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from ml_backend.models.siam_unet import SiamUNetModel, _binary_change_stats
+
+CPU = torch.device("cpu")
+
+
+@pytest.mark.skipif(_binary_change_stats is None, reason="numba not installed")
+@pytest.mark.parametrize("layout", [torch.contiguous_format, torch.channels_last])
+def test_binary_change_stats_match_softmax(layout):
+    logits = torch.randn(1, 2, 17, 23, generator=torch.Generator().manual_seed(0)) * 3
+    change_map = np.empty((17, 23), dtype=np.uint8)
+
+    changed, confidence = _binary_change_stats(logits.contiguous(memory_format=layout)[0].numpy(), 0.5, change_map)
+
+    probs = F.softmax(logits, dim=1)[0]
+    expected_map = (probs[1] > 0.5).numpy()
+    np.testing.assert_array_equal(change_map, expected_map)
+    assert changed == expected_map.sum()
+    assert confidence / change_map.size == pytest.approx(float(probs.max(dim=0).values.mean()), abs=1e-5)
+
+
+@pytest.mark.parametrize("enhanced", [True, False])
+def test_detection_matches_eager_softmax(image_pair, enhanced):
+    before, after = image_pair
+    wrapper = SiamUNetModel(img_size=64, enhanced=enhanced, device=CPU)
+    eager = copy.deepcopy(wrapper.model)
+
+    asyncio.run(wrapper.load_pretrained())
+    result = asyncio.run(wrapper.detect_binary_changes(before, after, threshold=0.5))
+
+    with torch.inference_mode():
+        probs = F.softmax(eager(*wrapper.preprocess_images(before, after)), dim=1)
+    expected_map = (probs[0, 1] > 0.5).numpy()
+    assert result["change_map"].dtype == np.uint8
+    assert np.mean(result["change_map"] != expected_map) <= 1e-3
+    assert result["change_percentage"] == pytest.approx(result["change_map"].mean() * 100)
+    assert result["confidence_score"] == pytest.approx(float(probs.max(dim=1).values.mean()), abs=1e-4)
+
+
+def test_feature_cache_matches_full_forward(image_pair):
+    before, after = image_pair
+    cached = SiamUNetModel(img_size=64, device=CPU, feature_cache_size=4)
+    uncached = SiamUNetModel(img_size=64, device=CPU)
+    uncached.model.load_state_dict(cached.model.state_dict())
+
+    async def run():
+        for wrapper in (cached, uncached):
+            await wrapper.load_pretrained()
+        first = await cached.detect_binary_changes(before, after)
+        # Reversed pair: both images are served from the cache
+        swapped = await cached.detect_binary_changes(after, before)
+        expected = await uncached.detect_binary_changes(before, after)
+        expected_swapped = await uncached.detect_binary_changes(after, before)
+        return first, swapped, expected, expected_swapped
+
+    first, swapped, expected, expected_swapped = asyncio.run(run())
+
+    assert len(cached.feature_cache) == 2
+    for actual, reference in ((first, expected), (swapped, expected_swapped)):
+        assert np.mean(actual["change_map"] != reference["change_map"]) <= 1e-3
+        assert actual["confidence_score"] == pytest.approx(reference["confidence_score"], abs=1e-4)
@@ -0,0 +1,43 @@
+"""
+Tests for the xView2 damage assessment wrapper
+"""
+
+import asyncio
+import copy
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from ml_backend.models.xview2_model import XView2DamageClassifier, XView2Model
+
+CPU = torch.device("cpu")
+
+
+def test_damage_assessment_matches_eager_softmax(image_pair):
+    before, after = image_pair
+    wrapper = XView2Model(img_size=128, device=CPU)
+    eager = copy.deepcopy(wrapper.model)
+
+    asyncio.run(wrapper.load_pretrained())
+    result = asyncio.run(wrapper.assess_building_damage(before, after, generate_visualizations=False))
+
+    with torch.inference_mode():
+        outputs = eager(*wrapper.preprocess_images(before, after))
+    building_mask = F.softmax(outputs["building_logits"], dim=1)[0].argmax(dim=0).numpy()
+    damage_probs = F.softmax(outputs["damage_logits"], dim=1)[0]
+    global_probs = F.softmax(outputs["global_damage_logits"], dim=1)[0]
+    expected_damage = damage_probs.argmax(dim=0).numpy() * building_mask
+
+    damage_map = result["damage_map"]
+    assert damage_map.dtype == np.uint8
+    assert damage_map.shape == (128, 128)
+    assert np.mean(result["building_mask"] != building_mask) <= 1e-3
+    assert np.mean(damage_map != expected_damage) <= 1e-3
+    assert result["building_count"] == int(result["building_mask"].sum())
+    assert result["confidence_score"] == pytest.approx(float(damage_probs.max(dim=0).values.mean()), abs=1e-4)
+    assert result["global_confidence"] == pytest.approx(float(global_probs.max()), abs=1e-4)
+    assert result["overall_damage_assessment"] == XView2DamageClassifier.DAMAGE_CLASSES[int(global_probs.argmax())]
+    for damage_id, damage_name in XView2DamageClassifier.DAMAGE_CLASSES.items():
+        assert result["damage_statistics"][damage_name]["pixels"] == np.sum(damage_map == damage_id)
@@ -10,8 +10,10 @@ import base64
 import io
 import torch
 import numpy as np
+import cv2
 from PIL import Image
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 from pathlib import Path
 import logging
 
@@ -116,23 +118,415 @@ def preprocess_image_pair(before_img: Image.Image, after_img: Image.Image,
     
     return before_tensor, after_tensor
 
-def encode_image_to_base64(image: Image.Image, format: str = "PNG") -> str:
+def image_to_device_tensor(img: Image.Image, size: Tuple[int, int], device: torch.device,
+                           mean: torch.Tensor, std: torch.Tensor,
+                           stream: Optional["torch.cuda.Stream"] = None) -> torch.Tensor:
+    """
+    Resize and normalize an image on the target device
+    
+    Only the uint8 pixels are transferred; resizing (antialiased bilinear, as
+    torchvision's PIL Resize) and normalization run on the device. On CUDA
+    the pixels are staged in pinned memory so the upload is an async DMA,
+    optionally issued on a separate copy stream. On CPU the uint8 pixels are
+    resized with cv2 instead (area filter when shrinking, as the antialias),
+    several times faster than a float interpolate.
+    
+    Args:
+        img: Input image
+        size: Output (height, width)
+        device: Device to preprocess on
+        mean: Per-channel mean in 0-255 scale, shape (1, 3, 1, 1), on device
+        std: Per-channel std in 0-255 scale, shape (1, 3, 1, 1), on device
+        stream: CUDA stream to issue the upload on
+        
+    Returns:
+        Normalized float tensor of shape (1, 3, height, width), channels_last
+    """
+    pixels = np.asarray(img.convert('RGB'))
+    
+    if device.type == 'cpu':
+        height, width = size
+        shrinking = pixels.shape[0] > height or pixels.shape[1] > width
+        pixels = cv2.resize(pixels, (width, height),
+                            interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        # HWC pixels permuted to NCHW are already channels_last
+        tensor = torch.from_numpy(pixels).permute(2, 0, 1).unsqueeze(0).float()
+        return (tensor - mean) / std
+    
+    if device.type == 'cuda':
+        # Pinned blocks are recycled by PyTorch's caching host allocator
+        staged = torch.empty(pixels.shape, dtype=torch.uint8, pin_memory=True)
+        staged.numpy()[...] = pixels
+        if stream is not None:
+            with torch.cuda.stream(stream):
+                tensor = staged.to(device, non_blocking=True)
+            current = torch.cuda.current_stream(device)
+            current.wait_stream(stream)
+            tensor.record_stream(current)
+        else:
+            tensor = staged.to(device, non_blocking=True)
+    else:
+        tensor = torch.from_numpy(pixels.copy()).to(device)
+    
+    tensor = tensor.permute(2, 0, 1).unsqueeze(0).float()
+    tensor = torch.nn.functional.interpolate(tensor, size=size, mode='bilinear',
+                                             align_corners=False, antialias=True)
+    return ((tensor - mean) / std).contiguous(memory_format=torch.channels_last)
+
+def get_autocast_dtype(device: torch.device) -> torch.dtype:
+    """
+    Pick the reduced-precision dtype for mixed-precision inference
+    
+    Args:
+        device: Device the model runs on
+        
+    Returns:
+        torch.bfloat16 where supported, otherwise torch.float16
+    """
+    if device.type == 'cuda' and not torch.cuda.is_bf16_supported():
+        return torch.float16
+    return torch.bfloat16
+
+def inference_autocast(device: torch.device, cache_enabled: bool = True) -> torch.autocast:
+    """
+    Autocast context for inference; only enabled on CUDA where Tensor Cores
+    make reduced precision a win (CPU stays in FP32)
+    
+    Args:
+        device: Device the model runs on
+        cache_enabled: Cache casted weights; disable when tracing or capturing graphs
+        
+    Returns:
+        torch.autocast context manager
+    """
+    return torch.autocast(device_type=device.type, dtype=get_autocast_dtype(device),
+                          enabled=device.type == 'cuda', cache_enabled=cache_enabled)
+
+def repeat_batch(example_inputs: Tuple[torch.Tensor, ...], batch_size: int) -> Tuple[torch.Tensor, ...]:
+    """Batch-1 example inputs repeated along the batch dim to batch_size"""
+    return tuple(x.repeat(batch_size, *([1] * (x.dim() - 1))) for x in example_inputs)
+
+def compile_for_inference(model: torch.nn.Module, example_inputs: Tuple[torch.Tensor, ...],
+                          mode: str = "reduce-overhead",
+                          batch_sizes: Tuple[int, ...] = (1,)) -> torch.nn.Module:
+    """
+    Compile a model with torch.compile and warm it up at each batch size
+    
+    Compilation is lazy and specialized to input shapes, so the warm-up
+    forwards pay the compile (and CUDA graph recording) cost at startup
+    instead of on the first request of each size. Set GSS_TORCH_COMPILE=0 to skip.
+    
+    Args:
+        model: Model in eval mode
+        example_inputs: Batch-1 inputs with the shapes used at inference time
+        mode: torch.compile mode
+        batch_sizes: Every batch size the model will be called with
+        
+    Returns:
+        Compiled model, or the original model if compilation is unavailable
+    """
+    if os.environ.get("GSS_TORCH_COMPILE", "1") == "0" or not hasattr(torch, "compile"):
+        return model
+    
+    try:
+        compiled = torch.compile(model, mode=mode, dynamic=False)
+        # Warm-up inputs are built outside inference mode, like request inputs,
+        # so their dispatch keys match the compiled guards
+        warmup_inputs = [repeat_batch(example_inputs, batch_size) for batch_size in batch_sizes]
+        with torch.inference_mode(), inference_autocast(example_inputs[0].device):
+            for inputs in warmup_inputs:
+                compiled(*inputs)
+        return compiled
+    except Exception as e:
+        logger.warning(f"torch.compile failed, using eager model: {str(e)}")
+        return model
+
+class CUDAGraphRunner:
+    """
+    Replays a forward pass captured in CUDA graphs, one per batch size
+    
+    Inputs are copied into static buffers and the captured kernels are
+    replayed without per-op launch overhead. Calls whose input shapes differ
+    from every captured one run the module eagerly.
+    """
+    
+    def __init__(self, module, example_inputs: Tuple[torch.Tensor, ...],
+                 batch_sizes: Tuple[int, ...] = (1,), warmup_iters: int = 3):
+        self.module = module
+        # batch size -> (static inputs, graph, static outputs)
+        self.graphs = {batch_size: self._capture(repeat_batch(example_inputs, batch_size), warmup_iters)
+                       for batch_size in batch_sizes}
+    
+    def _capture(self, example_inputs: Tuple[torch.Tensor, ...], warmup_iters: int):
+        static_inputs = [x.clone() for x in example_inputs]
+        # The autocast weight cache would hold tensors outside the graph's memory pool
+        autocast = inference_autocast(example_inputs[0].device, cache_enabled=False)
+        
+        # Warm up on a side stream so lazy initialization is not captured
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream), torch.inference_mode(), autocast:
+            for _ in range(warmup_iters):
+                self.module(*static_inputs)
+        torch.cuda.current_stream().wait_stream(stream)
+        
+        graph = torch.cuda.CUDAGraph()
+        with torch.inference_mode(), autocast, torch.cuda.graph(graph):
+            static_outputs = self.module(*static_inputs)
+        return static_inputs, graph, static_outputs
+    
+    def __call__(self, *inputs: torch.Tensor):
+        captured = self.graphs.get(inputs[0].shape[0])
+        if captured is None or any(x.shape != s.shape for x, s in zip(inputs, captured[0])):
+            return self.module(*inputs)
+        
+        static_inputs, graph, static_outputs = captured
+        for static, x in zip(static_inputs, inputs):
+            static.copy_(x, non_blocking=True)
+        graph.replay()
+        
+        # Outputs live in the graph's pool and are overwritten by the next replay
+        if isinstance(static_outputs, torch.Tensor):
+            return static_outputs.clone()
+        return [out.clone() for out in static_outputs]
+
+def capture_cuda_graph(module, example_inputs: Tuple[torch.Tensor, ...], batch_sizes: Tuple[int, ...] = (1,)):
+    """
+    Wrap a module in a CUDAGraphRunner for its example input shapes
+    
+    Args:
+        module: Model (eager or TorchScript) in eval mode on a CUDA device
+        example_inputs: Batch-1 inputs with the shapes to capture
+        batch_sizes: Batch sizes to capture a graph for
+        
+    Returns:
+        CUDAGraphRunner, or the original module if capture fails
+    """
+    try:
+        return CUDAGraphRunner(module, example_inputs, batch_sizes)
+    except Exception as e:
+        logger.warning(f"CUDA graph capture failed, using uncaptured model: {str(e)}")
+        return module
+
+def script_for_inference(model: torch.nn.Module,
+                         example_inputs: Optional[Tuple[torch.Tensor, ...]] = None) -> torch.nn.Module:
+    """
+    Script, freeze and optimize a model with TorchScript
+    
+    Used where torch.compile is unavailable; removes the Python interpreter
+    from the forward pass. With example inputs the model is traced instead of
+    scripted (mixed-precision casts are recorded into the graph) and warmed up
+    so the profiling executor specializes before the first request.
+    
+    Args:
+        model: Model in eval mode
+        example_inputs: Inputs to trace with, for models TorchScript cannot compile
+        
+    Returns:
+        Optimized ScriptModule, or the original model if scripting fails
+    """
+    try:
+        if example_inputs is None:
+            return torch.jit.optimize_for_inference(torch.jit.script(model))
+        
+        device = example_inputs[0].device
+        with torch.no_grad(), inference_autocast(device, cache_enabled=False):
+            traced = torch.jit.trace(model, example_inputs, strict=False)
+        optimized = torch.jit.optimize_for_inference(traced)
+        with torch.inference_mode():
+            for _ in range(2):
+                optimized(*example_inputs)
+        return optimized
+    except Exception as e:
+        logger.warning(f"TorchScript optimization failed, using eager model: {str(e)}")
+        return model
+
+def fuse_conv_bn(module: torch.nn.Module) -> int:
+    """
+    Fold BatchNorm2d layers into the Conv2d / ConvTranspose2d that precedes
+    them inside nn.Sequential containers (eval mode only)
+    
+    The BatchNorm is replaced by nn.Identity so module indices, and therefore
+    state_dict keys of the remaining layers, stay unchanged.
+    
+    Args:
+        module: Model in eval mode; modified in place
+        
+    Returns:
+        Number of BatchNorm layers folded
+    """
+    if module.training:
+        raise ValueError("BatchNorm can only be folded in eval mode")
+    
+    fused = 0
+    for seq in module.modules():
+        if not isinstance(seq, torch.nn.Sequential):
+            continue
+        for i in range(len(seq) - 1):
+            conv, bn = seq[i], seq[i + 1]
+            if (isinstance(conv, (torch.nn.Conv2d, torch.nn.ConvTranspose2d))
+                    and isinstance(bn, torch.nn.BatchNorm2d)):
+                seq[i] = fuse_conv_bn_eval(conv, bn, transpose=isinstance(conv, torch.nn.ConvTranspose2d))
+                seq[i + 1] = torch.nn.Identity()
+                fused += 1
+    return fused
+
+def optimize_for_cpu(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Apply Intel Extension for PyTorch operator optimizations when available
+    
+    Inference on CPU stays in FP32 (see inference_autocast), so weights are
+    prepacked without a dtype change.
+    
+    Args:
+        model: Model in eval mode on CPU
+        
+    Returns:
+        IPEX-optimized model, or the original model if IPEX is not installed
+    """
+    try:
+        import intel_extension_for_pytorch as ipex
+    except ImportError:
+        return model
+    
+    try:
+        return ipex.optimize(model, dtype=torch.float32, inplace=True)
+    except Exception as e:
+        logger.warning(f"IPEX optimization failed: {str(e)}")
+        return model
+
+def strip_dropout(module: torch.nn.Module) -> int:
+    """
+    Replace every nn.Dropout with nn.Identity for inference
+    
+    Args:
+        module: Model used only for inference; modified in place
+        
+    Returns:
+        Number of Dropout layers replaced
+    """
+    replaced = 0
+    for parent in module.modules():
+        for name, child in parent.named_children():
+            if isinstance(child, torch.nn.Dropout):
+                setattr(parent, name, torch.nn.Identity())
+                replaced += 1
+    return replaced
+
+def compile_tensorrt(model: torch.nn.Module, input_shapes: Tuple[Tuple[int, ...], ...],
+                     engine_name: str, cache_dir: str = "./model_cache",
+                     max_batch_size: int = 1) -> Optional[torch.nn.Module]:
+    """
+    Lower a model to a TensorRT engine with FP16 kernels (CUDA only)
+    
+    The compiled TorchScript module is cached on disk so later process starts
+    skip the build.
+    
+    Args:
+        model: Model in eval mode on a CUDA device
+        input_shapes: Shape of each forward input at batch size 1
+        engine_name: File name for the cached engine
+        cache_dir: Directory to cache compiled engines
+        max_batch_size: Largest batch the engine must accept
+        
+    Returns:
+        TensorRT-backed module, or None if torch_tensorrt is unavailable or fails
+    """
+    try:
+        import torch_tensorrt  # noqa: F401  (registers the TensorRT runtime ops)
+    except ImportError:
+        logger.warning("torch_tensorrt is not installed, skipping TensorRT compilation")
+        return None
+    
+    engine_path = Path(cache_dir) / engine_name
+    
+    try:
+        if engine_path.exists():
+            logger.info(f"Using cached TensorRT engine: {engine_path}")
+            return torch.jit.load(str(engine_path))
+        
+        trt_model = torch_tensorrt.compile(
+            model,
+            ir="ts",
+            inputs=[
+                torch_tensorrt.Input(min_shape=shape, opt_shape=shape,
+                                     max_shape=(max_batch_size, *shape[1:]), dtype=torch.float)
+                for shape in input_shapes
+            ],
+            enabled_precisions={torch.float, torch.half},
+            truncate_long_and_double=True
+        )
+        
+        engine_path.parent.mkdir(exist_ok=True)
+        torch.jit.save(trt_model, str(engine_path))
+        logger.info(f"TensorRT engine saved: {engine_path}")
+        return trt_model
+        
+    except Exception as e:
+        logger.warning(f"TensorRT compilation failed: {str(e)}")
+        return None
+
+def load_calibration_images(directory: str, limit: int = 50) -> List[Image.Image]:
+    """
+    Load representative images for post-training INT8 calibration
+    
+    Args:
+        directory: Directory of image tiles (png, jpg, tif)
+        limit: Maximum number of images to load
+        
+    Returns:
+        Up to `limit` RGB images in file name order
+    """
+    images = []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix.lower() in ('.png', '.jpg', '.jpeg', '.tif', '.tiff'):
+            images.append(Image.open(path).convert('RGB'))
+            if len(images) >= limit:
+                break
+    return images
+
+def encode_image_to_base64(image: Image.Image, format: str = "PNG",
+                           compress_level: Optional[int] = None) -> str:
     """
     Encode PIL Image to base64 string
     
     Args:
         image: PIL Image to encode
         format: Image format (PNG, JPEG, etc.)
+        compress_level: PNG zlib level 0-9 (PIL default 6); low levels encode
+            several times faster for flat-colored maps at a small size cost
         
     Returns:
         Base64 encoded image string
     """
     buffer = io.BytesIO()
-    image.save(buffer, format=format)
+    if compress_level is not None and format.upper() == "PNG":
+        image.save(buffer, format=format, compress_level=compress_level)
+    else:
+        image.save(buffer, format=format)
     image_bytes = buffer.getvalue()
     base64_string = base64.b64encode(image_bytes).decode('utf-8')
     return base64_string
 
+def encode_array_to_base64(image: np.ndarray, ext: str = ".png") -> str:
+    """
+    Encode a uint8 RGB (or grayscale) array to a base64 string with OpenCV,
+    skipping the PIL Image round-trip
+    
+    Args:
+        image: HxWx3 RGB or HxW grayscale uint8 array
+        ext: Image format extension understood by cv2.imencode
+        
+    Returns:
+        Base64 encoded image string
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    ok, buffer = cv2.imencode(ext, image)
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return base64.b64encode(buffer.tobytes()).decode('utf-8')
+
 def decode_base64_to_image(base64_string: str) -> Image.Image:
     """
     Decode base64 string to PIL Image
@@ -227,6 +621,26 @@ def apply_morphological_operations(change_map: np.ndarray,
     
     return (change_map_uint8 / 255.0).astype(np.float32)
 
+# 3x3 ellipse used by clean_change_map, built once
+_CLEANUP_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+def clean_change_map(change_map: np.ndarray) -> np.ndarray:
+    """
+    Opening (remove small isolated pixels) followed by closing (fill small holes)
+    
+    Same result as morphologyEx OPEN then CLOSE with a 3x3 ellipse, but the
+    adjacent dilations of the two run as one call.
+    
+    Args:
+        change_map: Binary change map (any integer or bool dtype)
+        
+    Returns:
+        Cleaned uint8 change map
+    """
+    change_map = cv2.erode(change_map.astype(np.uint8), _CLEANUP_KERNEL)
+    change_map = cv2.dilate(change_map, _CLEANUP_KERNEL, iterations=2)
+    return cv2.erode(change_map, _CLEANUP_KERNEL)
+
 def resize_tensor(tensor: torch.Tensor, target_size: Tuple[int, int]) -> torch.Tensor:
     """
     Resize tensor to target size
@@ -263,6 +677,87 @@ def ensure_same_size(img1: Image.Image, img2: Image.Image) -> Tuple[Image.Image,
     
     return img1_resized, img2_resized
 
+class InferenceBatcher:
+    """
+    Micro-batches concurrent inference requests
+    
+    Callers await submit() with batch-1 tensors; a background task collects
+    requests for up to max_wait_ms (or until max_batch_size is reached), runs
+    one forward on the concatenated batch in a worker thread (so the event loop
+    keeps serving other requests) and hands each caller its slice. Batches run
+    one at a time.
+    
+    With pad_batches, each batch is padded up to the next of batch_sizes
+    (powers of two, capped at max_batch_size), so a shape-specialized forward
+    (compiled or CUDA-graph captured for those sizes) never sees a new shape.
+    """
+    
+    def __init__(self, forward_fn, max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 pad_batches: bool = False):
+        self.forward_fn = forward_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.pad_batches = pad_batches
+        self.batch_sizes = tuple(sorted({min(2 ** i, max_batch_size)
+                                         for i in range(max_batch_size.bit_length() + 1)}))
+        self._queue = None
+        self._worker = None
+    
+    async def submit(self, *inputs: torch.Tensor) -> torch.Tensor:
+        """Queue inputs (each with a leading batch dim) and wait for their output"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        await self._queue.put((inputs, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                batched = [torch.cat(tensors, dim=0) for tensors in zip(*(inputs for inputs, _ in items))]
+                outputs = await asyncio.to_thread(self._forward, *batched)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            offset = 0
+            for inputs, future in items:
+                size = inputs[0].shape[0]
+                if not future.done():
+                    future.set_result(outputs[offset:offset + size])
+                offset += size
+    
+    def _forward(self, *batched: torch.Tensor) -> torch.Tensor:
+        """Forward one batch, padded to a fixed size when requested (runs in a worker thread)"""
+        num_rows = batched[0].shape[0]
+        if self.pad_batches:
+            size = next((s for s in self.batch_sizes if s >= num_rows), num_rows)
+            if size > num_rows:
+                batched = [torch.cat([x, x[-1:].expand(size - num_rows, *x.shape[1:])]) for x in batched]
+        
+        outputs = self.forward_fn(*batched)
+        # Clone: compiled graphs may overwrite their output buffers on the next call
+        return outputs[:num_rows].clone()
+
+
 class ModelProfiler:
     """Simple profiler for model inference time"""
     